@@ -0,0 +1,234 @@
+# assets.py
+"""
+Build fingerprinted, precompressed static assets, and serve them.
+
+Run at build time:
+    python -m app.assets
+
+Copies app/static to STATIC_BUILD_DIR with a content hash in every file name,
+converts raster images to WebP when Pillow is installed and that is smaller,
+rewrites asset URLs inside CSS, and writes .gz (and, with the optional brotli
+package, .br) copies of text assets. Templates resolve names through
+asset_url() and the manifest; without a build the sources are served as-is.
+"""
+import gzip
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+
+from environs import Env
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+from .pagecache import brotli, get_encodings
+
+# Pillow is optional, raster images are kept as they are without it
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+STATIC_DIR = "app/static"
+STATIC_BUILD_DIR = env.str("STATIC_BUILD_DIR", "app/static-build")
+MANIFEST_NAME = "manifest.json"
+
+# Fingerprinted files never change, anything else is revalidated often
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STATIC_CACHE_CONTROL = env.str("STATIC_CACHE_CONTROL", "public, max-age=3600")
+
+COMPRESSIBLE = {".css", ".js", ".svg", ".webmanifest", ".ico", ".json"}
+CONVERTIBLE = {".png", ".jpg", ".jpeg"}
+WEBP_QUALITY = env.int("WEBP_QUALITY", 80)
+
+# Icons browsers and home screens expect as PNG, never converted
+KEEP_FORMAT = {"img/favicon"}
+
+# url(...) references to static assets inside CSS
+CSS_URL = re.compile(r"""url\((['"]?)/static/([^'")]+)\1\)""")
+
+FINGERPRINTED = re.compile(r"\.[0-9a-f]{12}\.[^./]+$")
+
+
+def load_manifest(build_dir=STATIC_BUILD_DIR):
+    """Map source asset paths to their built names, empty without a build"""
+    try:
+        with open(os.path.join(build_dir, MANIFEST_NAME)) as file:
+            return json.load(file)
+
+    except FileNotFoundError:
+        return {}
+
+
+manifest = load_manifest()
+
+
+def asset_url(path):
+    """Get the URL of a static asset, fingerprinted when built"""
+    return f"/static/{manifest.get(path, path)}"
+
+
+def fingerprint(path, content):
+    """Insert a content hash before a file's extension"""
+    root, extension = os.path.splitext(path)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+
+    return f"{root}.{digest}{extension}"
+
+
+def to_webp(source):
+    """Convert a raster image to WebP, or None if that does not save bytes"""
+    with Image.open(source) as image:
+        output = io.BytesIO()
+        image.save(output, "WEBP", quality=WEBP_QUALITY, method=6)
+
+    content = output.getvalue()
+
+    return content if len(content) < os.path.getsize(source) else None
+
+
+def precompress(path, content):
+    """Write gzip and brotli copies of a text asset next to it"""
+    with open(path + ".gz", "wb") as file:
+        file.write(gzip.compress(content, compresslevel=9))
+
+    if brotli is not None:
+        with open(path + ".br", "wb") as file:
+            file.write(brotli.compress(content, quality=11))
+
+
+def write(build_dir, path, content):
+    full_path = os.path.join(build_dir, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+    with open(full_path, "wb") as file:
+        file.write(content)
+
+    if os.path.splitext(path)[1] in COMPRESSIBLE:
+        precompress(full_path, content)
+
+
+def build(source_dir=STATIC_DIR, build_dir=STATIC_BUILD_DIR):
+    """
+    Build the static assets and their manifest.
+
+    Originals are copied under their own names too, so URLs stored elsewhere
+    (cached pages, the web manifest) keep working.
+
+    Returns:
+    - dict: The manifest, mapping source paths to fingerprinted paths.
+
+    """
+    shutil.rmtree(build_dir, ignore_errors=True)
+    paths = []
+
+    for root, _, files in os.walk(source_dir):
+        for name in files:
+            paths.append(os.path.relpath(os.path.join(root, name), source_dir))
+
+    # CSS last, so the URLs it references are already fingerprinted
+    paths.sort(key=lambda path: (path.endswith(".css"), path))
+    built = {}
+
+    for path in paths:
+        source = os.path.join(source_dir, path)
+        extension = os.path.splitext(path)[1].lower()
+
+        with open(source, "rb") as file:
+            content = file.read()
+
+        write(build_dir, path, content)
+        output_path = path
+
+        if (
+            Image is not None
+            and extension in CONVERTIBLE
+            and not path.startswith(tuple(KEEP_FORMAT))
+        ):
+            webp = to_webp(source)
+
+            if webp is not None:
+                content, output_path = webp, os.path.splitext(path)[0] + ".webp"
+
+        if extension == ".css":
+            content = CSS_URL.sub(
+                lambda match: f"url('/static/{built.get(match[2], match[2])}')",
+                content.decode(),
+            ).encode()
+
+        built[path] = fingerprint(output_path, content)
+        write(build_dir, built[path], content)
+        logging.info(f"Built {built[path]} ({len(content)} bytes)")
+
+    with open(os.path.join(build_dir, MANIFEST_NAME), "w") as file:
+        json.dump(built, file, indent=2, sort_keys=True)
+
+    return built
+
+
+class AssetFiles(StaticFiles):
+    """
+    Static files with long-lived caching and precompressed variants.
+
+    Fingerprinted names are cached as immutable. A .br or .gz copy is sent in
+    place of the file when one exists and the client accepts it.
+
+    """
+
+    async def get_response(self, path, scope):
+        encodings = get_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        response = None
+
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding in encodings and self.lookup_path(path + suffix)[1]:
+                response = await super().get_response(path + suffix, scope)
+
+                if response.status_code == 200:
+                    media_type, _ = mimetypes.guess_type(path)
+                    response.headers["Content-Type"] = (
+                        media_type or "application/octet-stream"
+                    )
+                    response.headers["Content-Encoding"] = encoding
+
+                break
+
+        if response is None:
+            response = await super().get_response(path, scope)
+
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = (
+                IMMUTABLE_CACHE_CONTROL
+                if FINGERPRINTED.search(path)
+                else STATIC_CACHE_CONTROL
+            )
+            response.headers["Vary"] = "Accept-Encoding"
+
+        return response
+
+
+def check_optional_dependencies():
+    """Warn when Pillow or brotli is missing and their features are off"""
+    if Image is None:
+        logging.warning("Pillow is not installed, images are not converted to WebP")
+
+    if brotli is None:
+        logging.warning("Brotli is not installed, responses are gzip only")
+
+
+def get_static_directory():
+    """Serve the build when there is one, else the sources"""
+    return STATIC_BUILD_DIR if manifest else STATIC_DIR
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    check_optional_dependencies()
+    built = build()
+    logging.info(f"Built {len(built)} assets into {STATIC_BUILD_DIR}")
@@ -0,0 +1,147 @@
+# breaker.py
+import logging
+import time
+
+from environs import Env
+from urllib.parse import urlsplit
+from .cache import MemoryCache
+from .metrics import register
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+# Consecutive failures that open a host's circuit, and seconds before a probe
+BREAKER_FAILURES = env.int("BREAKER_FAILURES", 5)
+BREAKER_RESET = env.float("BREAKER_RESET", 30.0)
+
+# Seconds a failed URL is answered as unavailable without being requested
+NEGATIVE_TTL = env.float("NEGATIVE_TTL", 30.0)
+NEGATIVE_CACHE_SIZE = env.int("NEGATIVE_CACHE_SIZE", 1024)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class SourceUnavailable(Exception):
+    """Raised instead of requesting a source known to be failing"""
+
+
+class CircuitBreaker:
+    """
+    Track failures for one upstream host.
+
+    After BREAKER_FAILURES consecutive errors the circuit opens and requests
+    fail at once. Once BREAKER_RESET has passed a single probe is let through:
+    success closes the circuit, failure opens it again.
+
+    """
+
+    def __init__(self, failures, reset):
+        self.max_failures = failures
+        self.reset = reset
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_started = 0.0
+
+    def allow(self):
+        if self.state == CLOSED:
+            return True
+
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset:
+            self.state = HALF_OPEN
+
+        # Only one probe at a time while half-open, unless the last one was lost
+        if self.state == HALF_OPEN and (
+            not self.probing or time.monotonic() - self.probe_started >= self.reset
+        ):
+            self.probing = True
+            self.probe_started = time.monotonic()
+            return True
+
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+
+        if self.state == HALF_OPEN or self.failures >= self.max_failures:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+
+breakers = {}
+failed_urls = MemoryCache(NEGATIVE_CACHE_SIZE)
+
+register(
+    "reelratings_circuit_breaker_state",
+    "gauge",
+    "1 for each host's current circuit state",
+    lambda: [
+        ({"host": host, "state": state}, int(breaker.state == state))
+        for host, breaker in breakers.items()
+        for state in (CLOSED, OPEN, HALF_OPEN)
+    ],
+)
+
+
+def get_breaker(host):
+    """Return the circuit breaker for a host, creating it on first use"""
+    if host not in breakers:
+        breakers[host] = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET)
+
+    return breakers[host]
+
+
+def check(url):
+    """
+    Fail fast for a URL that recently failed or whose host's circuit is open.
+
+    Raises:
+    - SourceUnavailable: If the URL should not be requested right now.
+
+    """
+    failed_until = failed_urls.get(url)
+
+    if failed_until is not None and time.monotonic() < failed_until:
+        raise SourceUnavailable(f"{url} recently failed")
+
+    host = urlsplit(url).hostname
+
+    if not get_breaker(host).allow():
+        raise SourceUnavailable(f"Circuit open for {host}")
+
+
+def record_success(url):
+    get_breaker(urlsplit(url).hostname).record_success()
+
+
+def record_failure(url, host_error=True):
+    """
+    Remember a failed URL, and count it against its host when the host is at
+    fault (errors, timeouts, 5xx or rate limiting rather than e.g. a 404).
+    Otherwise the host did answer, which counts as a success for its circuit
+    and completes a half-open probe.
+
+    """
+    failed_urls.set(url, time.monotonic() + NEGATIVE_TTL)
+    host = urlsplit(url).hostname
+    breaker = get_breaker(host)
+
+    if not host_error:
+        breaker.record_success()
+        return
+
+    was_open = breaker.state == OPEN
+    breaker.record_failure()
+
+    if breaker.state == OPEN and not was_open:
+        logging.error(f"Circuit opened for {host}")
@@ -0,0 +1,354 @@
+# cache.py
+import asyncio
+import functools
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict, namedtuple
+from contextvars import ContextVar
+from environs import Env
+from urllib.parse import urlsplit, urlunsplit
+from .metrics import CACHE_LOOKUPS, server_timings
+from .ratelimit import BACKGROUND, priority
+from .singleflight import single_flight
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+# On-disk store shared by all workers on the host, and per-worker LRU size
+CACHE_PATH = env.str("CACHE_PATH", "cache.sqlite3")
+CACHE_MEMORY_SIZE = env.int("CACHE_MEMORY_SIZE", 2048)
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# Time-to-live per source in seconds, each overridable with CACHE_TTL_<SOURCE>
+DEFAULT_TTLS = {
+    "tmdb": DAY,
+    "tmdb_search": HOUR,
+    "rottentomatoes_url": 7 * DAY,
+    "rottentomatoes_scores": 3 * HOUR,
+    "letterboxd_url": 7 * DAY,
+    "letterboxd_rating": 6 * HOUR,
+    "commonsense_info": 7 * DAY,
+    "imdb_rating": 6 * HOUR,
+    "box_office_amounts": DAY,
+    "justwatch_page": DAY,
+}
+CACHE_TTLS = {
+    source: env.int(f"CACHE_TTL_{source.upper()}", ttl)
+    for source, ttl in DEFAULT_TTLS.items()
+}
+
+# How long past its TTL an entry may still be served while it is refreshed
+CACHE_GRACE = env.int("CACHE_GRACE", DAY)
+
+# Seconds between sweeps of expired entries, per key prefix and worker
+CACHE_PRUNE_INTERVAL = env.int("CACHE_PRUNE_INTERVAL", HOUR)
+
+Entry = namedtuple("Entry", ["value", "stored_at"])
+
+# Age in seconds of each source value served during the current request
+source_ages = ContextVar("source_ages", default=None)
+
+# When set, lookups are answered from the cache only and never go upstream
+cache_only = ContextVar("cache_only", default=False)
+
+# Keys being refreshed in the background, and strong references to the tasks
+refreshing_keys = set()
+background_tasks = set()
+
+# When each key prefix's expired entries were last swept
+pruned_at = {}
+
+
+class CacheMiss(Exception):
+    """Raised by a cache-only lookup with nothing servable in the cache"""
+
+
+class MemoryCache:
+    """Bounded least-recently-used cache held in worker memory"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+
+        if entry is not None:
+            self.entries.move_to_end(key)
+
+        return entry
+
+    def set(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def delete(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class DiskCache:
+    """SQLite store in WAL mode so concurrent workers can share entries"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(
+                self.path, timeout=5, check_same_thread=False
+            )
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self.connection.commit()
+
+        return self.connection
+
+    def get(self, key):
+        with self.lock:
+            row = (
+                self.connect()
+                .execute("SELECT value, stored_at FROM cache WHERE key = ?", (key,))
+                .fetchone()
+            )
+
+        return Entry(json.loads(row[0]), row[1]) if row else None
+
+    def set(self, key, entry):
+        with self.lock:
+            connection = self.connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(entry.value), entry.stored_at),
+            )
+            connection.commit()
+
+    def delete(self, key):
+        with self.lock:
+            connection = self.connect()
+            connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+            connection.commit()
+
+    def prune(self, prefix, stored_before):
+        """Delete the entries under a key prefix stored before a time"""
+        with self.lock:
+            connection = self.connect()
+            connection.execute(
+                "DELETE FROM cache WHERE key GLOB ? AND stored_at < ?",
+                (f"{prefix}:*", stored_before),
+            )
+            connection.commit()
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+memory_cache = MemoryCache(CACHE_MEMORY_SIZE)
+disk_cache = DiskCache(CACHE_PATH)
+
+
+def normalize_arg(arg):
+    """Normalize a lookup argument so equivalent URLs and IDs share a key"""
+    if not isinstance(arg, str):
+        return arg
+
+    arg = arg.strip()
+
+    if arg.startswith(("http://", "https://")):
+        scheme, netloc, path, query, _ = urlsplit(arg)
+        return urlunsplit((scheme.lower(), netloc.lower(), path, query, ""))
+
+    return arg
+
+
+def make_key(source, *args):
+    """Build the cache key for a source and its lookup arguments"""
+    return f"{source}:{json.dumps([normalize_arg(arg) for arg in args])}"
+
+
+def get_age(entry):
+    """Get the age of an entry in seconds"""
+    return time.time() - entry.stored_at
+
+
+def is_fresh(source, entry):
+    """Check whether an entry is still within its source's time-to-live"""
+    return get_age(entry) < CACHE_TTLS[source]
+
+
+def is_servable(source, entry):
+    """Check whether a stale entry is still inside the grace window"""
+    return get_age(entry) < CACHE_TTLS[source] + CACHE_GRACE
+
+
+def record_age(source, age):
+    """Record the age of a value served to the current request"""
+    ages = source_ages.get()
+
+    if ages is not None:
+        ages[source] = max(age, ages.get(source, 0))
+
+
+async def get_entry(source, *args):
+    """Look up an entry in memory first, then on disk"""
+    key = make_key(source, *args)
+    entry = memory_cache.get(key)
+
+    if entry is None:
+        entry = await asyncio.to_thread(disk_cache.get, key)
+
+        # Promote disk hits so repeat views stay in memory
+        if entry is not None:
+            memory_cache.set(key, entry)
+
+    return entry
+
+
+async def set_entry(source, value, *args):
+    """Store a value in both cache tiers"""
+    key = make_key(source, *args)
+    entry = Entry(value, time.time())
+    memory_cache.set(key, entry)
+    await asyncio.to_thread(disk_cache.set, key, entry)
+
+    return entry
+
+
+async def delete_entry(source, *args):
+    """Drop a value from both cache tiers so the next lookup goes upstream"""
+    key = make_key(source, *args)
+    memory_cache.delete(key)
+    await asyncio.to_thread(disk_cache.delete, key)
+
+
+async def prune_entries(prefix, max_age):
+    """Delete a key prefix's entries older than max_age, once per interval"""
+    now = time.time()
+
+    if now - pruned_at.get(prefix, 0) < CACHE_PRUNE_INTERVAL:
+        return
+
+    pruned_at[prefix] = now
+    await asyncio.to_thread(disk_cache.prune, prefix, now - max_age)
+
+
+async def fetch(source, func, args, key_args):
+    """Run a lookup and store its result in both cache tiers"""
+    value = await func(*args)
+    await set_entry(source, value, *key_args)
+
+    # Entries past their grace are never served again, so drop them
+    await prune_entries(source, CACHE_TTLS[source] + CACHE_GRACE)
+
+    return value
+
+
+async def refresh(source, func, args, key_args):
+    """Re-run a lookup and store its result, logging rather than raising"""
+    key = make_key(source, *key_args)
+
+    # Queue behind interactive page views for the upstream hosts, and keep
+    # out of the triggering request's Server-Timing header
+    priority.set(BACKGROUND)
+    server_timings.set(None)
+
+    try:
+        await single_flight(key, fetch, source, func, args, key_args)
+
+    except Exception as exc:
+        logging.error(f"Background refresh of {key} failed: {exc}")
+
+    finally:
+        refreshing_keys.discard(key)
+
+
+def schedule_refresh(source, func, args, key_args):
+    """Refresh an expired entry in the background, once per key"""
+    key = make_key(source, *key_args)
+
+    if key in refreshing_keys:
+        return
+
+    refreshing_keys.add(key)
+    task = asyncio.create_task(refresh(source, func, args, key_args))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+def cached(source, key=None):
+    """
+    Cache the result of an async lookup under the source's time-to-live.
+
+    Entries past their TTL but inside the grace window are served
+    immediately while a background task refreshes them
+    (stale-while-revalidate).
+
+    Parameters:
+    - source (str): The name of the source, used to pick its TTL.
+    - key (callable, optional): Maps the call arguments to the cache key
+      arguments. Defaults to all positional arguments.
+
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args):
+            key_args = key(*args) if key else args
+            entry = await get_entry(source, *key_args)
+
+            if entry is not None and is_fresh(source, entry):
+                CACHE_LOOKUPS.inc(source=source, result="fresh")
+                record_age(source, get_age(entry))
+                return entry.value
+
+            if entry is not None and is_servable(source, entry):
+                CACHE_LOOKUPS.inc(source=source, result="stale")
+
+                if not cache_only.get():
+                    schedule_refresh(source, func, args, key_args)
+
+                record_age(source, get_age(entry))
+                return entry.value
+
+            CACHE_LOOKUPS.inc(source=source, result="miss")
+
+            if cache_only.get():
+                raise CacheMiss(make_key(source, *key_args))
+
+            # Concurrent misses for the same key share one upstream fetch
+            value = await single_flight(
+                make_key(source, *key_args), fetch, source, func, args, key_args
+            )
+            record_age(source, 0)
+
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def close_cache():
+    """Close the on-disk store"""
+    disk_cache.close()
@@ -0,0 +1,65 @@
+# client.py
+import logging
+
+import httpx
+
+from environs import Env
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+# Connection pool settings for the shared HTTP client
+HTTP2_ENABLED = env.bool("HTTP2_ENABLED", False)
+HTTP_MAX_CONNECTIONS = env.int("HTTP_MAX_CONNECTIONS", 100)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = env.int("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+HTTP_KEEPALIVE_EXPIRY = env.float("HTTP_KEEPALIVE_EXPIRY", 30.0)
+
+_client = None
+
+
+def create_client():
+    """Create an HTTP client with per-host keep-alive connection pools"""
+    http2 = HTTP2_ENABLED
+
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logging.warning("HTTP2_ENABLED is set but 'h2' is not installed")
+            http2 = False
+
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+    return httpx.AsyncClient(limits=limits, http2=http2, follow_redirects=True)
+
+
+async def start_client():
+    """Open the app-lifetime HTTP client"""
+    global _client
+
+    if _client is None:
+        _client = create_client()
+
+
+async def close_client():
+    """Close the app-lifetime HTTP client and its pooled connections"""
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client():
+    """Return the shared HTTP client, opening it if the app has not started it"""
+    global _client
+
+    if _client is None:
+        _client = create_client()
+
+    return _client
@@ -0,0 +1,186 @@
+# export.py
+"""
+Export ratings for many titles without the web server.
+
+Usage:
+    python -m app.export titles.csv --output ratings.jsonl --concurrency 8
+
+Input is CSV with tmdb_id and media_type columns, or JSONL objects with the
+same keys. Results are written as they finish, and every complete title is
+recorded in a checkpoint file so an interrupted run resumes where it stopped.
+Titles that failed, had sources unavailable, or were missing from the cache
+under --cache-only, are left out of the checkpoint so a later run fills them
+in.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+
+from .cache import close_cache
+from .client import close_client
+from .id_index import close_index
+from .parsing import close_executor
+from .sources import rate_titles
+
+CSV_FIELDS = [
+    "tmdb_id",
+    "media_type",
+    "status",
+    "title",
+    "year",
+    "imdb_id",
+    "imdb_rating",
+    "tomatometer",
+    "audience_score",
+    "letterboxd_rating",
+    "commonsense_rating",
+    "domestic_box_office",
+    "international_box_office",
+    "worldwide_box_office",
+    "rottentomatoes_url",
+    "letterboxd_url",
+    "commonsense_url",
+    "unavailable",
+]
+
+
+def normalize_media_type(media_type):
+    """Map TMDB style media types ('movie', 'tv') to the app's ('Movie', 'TV')"""
+    return "TV" if media_type.strip().lower() == "tv" else "Movie"
+
+
+def read_titles(path):
+    """Read (tmdb_id, media_type) pairs from a CSV or JSONL file"""
+    with open(path, newline="") as file:
+        if path.endswith(".jsonl"):
+            rows = (json.loads(line) for line in file if line.strip())
+        else:
+            rows = csv.DictReader(file)
+
+        for row in rows:
+            yield str(row["tmdb_id"]).strip(), normalize_media_type(row["media_type"])
+
+
+def get_title_key(tmdb_id, media_type):
+    return f"{media_type}/{tmdb_id}"
+
+
+def read_checkpoint(path):
+    """Get the keys of the titles completed by earlier runs"""
+    if not os.path.exists(path):
+        return set()
+
+    with open(path) as file:
+        return {line.strip() for line in file if line.strip()}
+
+
+def flatten(result):
+    """Flatten a ratings result into a CSV row"""
+    details = result.get("details") or {}
+    ratings = result.get("ratings") or {}
+    scores = ratings.get("rottentomatoes_scores") or {}
+    commonsense = ratings.get("commonsense_info") or {}
+    amounts = (ratings.get("box_office_amounts") or []) + [None] * 3
+
+    return {
+        "tmdb_id": result["tmdb_id"],
+        "media_type": result["media_type"],
+        "status": result["status"],
+        "title": details.get("title"),
+        "year": details.get("year"),
+        "imdb_id": details.get("imdb_id"),
+        "imdb_rating": ratings.get("imdb_rating"),
+        "tomatometer": scores.get("tomatometer"),
+        "audience_score": scores.get("audience_score"),
+        "letterboxd_rating": ratings.get("letterboxd_rating"),
+        "commonsense_rating": commonsense.get("rating"),
+        "domestic_box_office": amounts[0],
+        "international_box_office": amounts[1],
+        "worldwide_box_office": amounts[2],
+        "rottentomatoes_url": ratings.get("rottentomatoes_url"),
+        "letterboxd_url": ratings.get("letterboxd_url"),
+        "commonsense_url": commonsense.get("url"),
+        "unavailable": " ".join(result.get("unavailable", [])),
+    }
+
+
+async def export(args):
+    """Rate every title not yet in the checkpoint and write the results"""
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint"
+    finished = read_checkpoint(checkpoint_path)
+    output_format = args.format or ("csv" if args.output.endswith(".csv") else "jsonl")
+    write_header = output_format == "csv" and not os.path.exists(args.output)
+
+    titles = (
+        (tmdb_id, media_type)
+        for tmdb_id, media_type in read_titles(args.input)
+        if get_title_key(tmdb_id, media_type) not in finished
+    )
+
+    if finished:
+        logging.info(f"Resuming, skipping {len(finished)} finished titles")
+
+    count = 0
+
+    with open(args.output, "a", newline="") as output, open(
+        checkpoint_path, "a"
+    ) as checkpoint:
+        writer = csv.DictWriter(output, CSV_FIELDS)
+
+        if write_header:
+            writer.writeheader()
+
+        async for result in rate_titles(titles, args.concurrency, args.cache_only):
+            if output_format == "csv":
+                writer.writerow(flatten(result))
+            else:
+                output.write(json.dumps(result) + "\n")
+
+            # Record the title only once its result is safely written, and
+            # leave incomplete titles out so a later run retries them
+            output.flush()
+
+            if result["status"] == "ok" and not result["unavailable"]:
+                key = get_title_key(result["tmdb_id"], result["media_type"])
+                checkpoint.write(key + "\n")
+                checkpoint.flush()
+
+            count += 1
+
+            if count % 100 == 0:
+                logging.info(f"Exported {count} titles")
+
+    logging.info(f"Exported {count} titles to {args.output}")
+
+
+async def main(args):
+    try:
+        await export(args)
+
+    finally:
+        await close_client()
+        close_cache()
+        close_index()
+        close_executor()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("input", help="CSV or JSONL file of tmdb_id, media_type")
+    parser.add_argument("--output", "-o", required=True, help="JSONL or CSV output")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Output format")
+    parser.add_argument("--concurrency", "-c", type=int, default=8)
+    parser.add_argument("--checkpoint", help="Defaults to <output>.checkpoint")
+    parser.add_argument(
+        "--cache-only", action="store_true", help="Never scrape, use cached data only"
+    )
+
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(main(parse_args()))
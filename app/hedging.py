@@ -0,0 +1,136 @@
+# hedging.py
+import asyncio
+import contextlib
+import math
+import time
+
+from collections import defaultdict, deque
+from environs import Env
+from urllib.parse import urlsplit
+from .metrics import register
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+# Hosts to hedge requests for, e.g. "www.imdb.com,www.rottentomatoes.com"
+HEDGE_HOSTS = env.list("HEDGE_HOSTS", [])
+
+# Fire a second request once the first is slower than this latency percentile
+HEDGE_PERCENTILE = env.float("HEDGE_PERCENTILE", 95.0)
+
+# Most extra requests hedging may add, as a fraction of hedgeable requests
+HEDGE_BUDGET = env.float("HEDGE_BUDGET", 0.05)
+
+# Latency samples kept per host, and needed before hedging starts
+HEDGE_WINDOW = env.int("HEDGE_WINDOW", 200)
+HEDGE_MIN_SAMPLES = env.int("HEDGE_MIN_SAMPLES", 20)
+
+# Counters for hedgeable requests, hedges fired and hedges that won
+stats = {"requests": 0, "hedged": 0, "won": 0}
+
+register(
+    "reelratings_hedging_requests_total",
+    "counter",
+    "Hedgeable requests, hedges fired and hedges that won",
+    lambda: [({"outcome": outcome}, count) for outcome, count in stats.items()],
+)
+
+
+class LatencyTracker:
+    """Rolling window of request latencies for one host"""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, percent):
+        """Get a latency percentile, or None until there are enough samples"""
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, math.ceil(percent / 100 * len(ordered)) - 1)
+
+        return ordered[index]
+
+
+trackers = defaultdict(lambda: LatencyTracker(HEDGE_WINDOW))
+
+
+async def timed(host, attempt):
+    """Run one attempt, recording its latency when it completes"""
+    started = time.perf_counter()
+    result = await attempt()
+    trackers[host].add(time.perf_counter() - started)
+
+    return result
+
+
+def within_budget():
+    return stats["hedged"] < HEDGE_BUDGET * stats["requests"]
+
+
+async def hedged(url, attempt):
+    """
+    Run a request, hedging it with a second identical one if it runs long.
+
+    For hosts listed in HEDGE_HOSTS, once the first attempt has taken longer
+    than the host's rolling HEDGE_PERCENTILE latency, a second attempt is
+    started if the HEDGE_BUDGET allows. Whichever succeeds first wins and the
+    other is cancelled.
+
+    Parameters:
+    - url (str): The URL being requested, used to pick the host.
+    - attempt (callable): Coroutine function making one request.
+
+    Returns:
+    - The result of the winning attempt.
+
+    """
+    host = urlsplit(url).hostname
+
+    if host not in HEDGE_HOSTS:
+        return await timed(host, attempt)
+
+    stats["requests"] += 1
+    threshold = trackers[host].percentile(HEDGE_PERCENTILE)
+    first = asyncio.create_task(timed(host, attempt))
+    tasks = {first}
+
+    try:
+        if threshold is not None:
+            done, _ = await asyncio.wait(tasks, timeout=threshold)
+
+            if not done and within_budget():
+                stats["hedged"] += 1
+                tasks.add(asyncio.create_task(timed(host, attempt)))
+
+        # Take the first attempt to succeed, or the last error if none does
+        pending = set(tasks)
+
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            succeeded = [task for task in done if task.exception() is None]
+
+            if succeeded:
+                if succeeded[0] is not first:
+                    stats["won"] += 1
+
+                return succeeded[0].result()
+
+            if not pending:
+                return done.pop().result()
+
+    finally:
+        for task in tasks:
+            task.cancel()
+
+        # Let cancelled attempts release their connections and rate limit slots
+        with contextlib.suppress(asyncio.CancelledError):
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,145 @@
+# id_index.py
+import asyncio
+import functools
+import json
+import sqlite3
+import threading
+import time
+
+from environs import Env
+from .cache import (
+    CACHE_MEMORY_SIZE,
+    CACHE_PATH,
+    DAY,
+    MemoryCache,
+    cache_only,
+    delete_entry,
+)
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+# How long resolved URLs and "not found" results are trusted, in seconds
+INDEX_TTL = env.int("INDEX_TTL", 90 * DAY)
+INDEX_NEGATIVE_TTL = env.int("INDEX_NEGATIVE_TTL", DAY)
+
+
+class IdIndex:
+    """Durable mapping from a title to the value resolved for it on each site"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(
+                self.path, timeout=5, check_same_thread=False
+            )
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS id_index "
+                "(title_key TEXT NOT NULL, site TEXT NOT NULL, value TEXT, "
+                "resolved_at REAL NOT NULL, PRIMARY KEY (title_key, site))"
+            )
+            self.connection.commit()
+
+        return self.connection
+
+    def get(self, title_key, site):
+        """Get the (value, resolved_at) pair recorded for a title and site"""
+        with self.lock:
+            row = (
+                self.connect()
+                .execute(
+                    "SELECT value, resolved_at FROM id_index "
+                    "WHERE title_key = ? AND site = ?",
+                    (title_key, site),
+                )
+                .fetchone()
+            )
+
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, title_key, site, entry):
+        """Record the (value, resolved_at) pair for a title and site"""
+        with self.lock:
+            connection = self.connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO id_index "
+                "(title_key, site, value, resolved_at) VALUES (?, ?, ?, ?)",
+                (title_key, site, json.dumps(entry[0]), entry[1]),
+            )
+            connection.commit()
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+id_index = IdIndex(CACHE_PATH)
+memory_index = MemoryCache(CACHE_MEMORY_SIZE)
+
+
+def is_current(entry):
+    """Check whether a recorded value, or a "not found" result, has expired"""
+    value, resolved_at = entry
+    ttl = INDEX_NEGATIVE_TTL if value is None else INDEX_TTL
+
+    return time.time() - resolved_at < ttl
+
+
+def indexed(site, func):
+    """
+    Resolve a title's value on a site through the index before searching.
+
+    The wrapped function takes the title key (its IMDb ID, or a TMDB key when
+    there is none) followed by the arguments of func. Once a title has been
+    resolved, later calls skip the search page entirely. func is the cached
+    lookup; once the index entry expires, the cached value is dropped too, so
+    the search runs again rather than returning what the cache still holds.
+    Cache-only calls read the cached value but leave the index untouched.
+
+    """
+
+    @functools.wraps(func)
+    async def wrapper(title_key, *args):
+        if not title_key:
+            return await func(*args)
+
+        entry = memory_index.get((title_key, site))
+
+        if entry is None:
+            entry = await asyncio.to_thread(id_index.get, title_key, site)
+
+            if entry is not None:
+                memory_index.set((title_key, site), entry)
+
+        if entry is not None and is_current(entry):
+            return entry[0]
+
+        # A cache-only read never searched, so it must not renew the entry
+        if cache_only.get():
+            return await func(*args)
+
+        # The source cache keeps "not found" far longer than the index does
+        if entry is not None:
+            await delete_entry(site, *args)
+
+        value = await func(*args)
+        entry = (value, time.time())
+        memory_index.set((title_key, site), entry)
+        await asyncio.to_thread(id_index.set, title_key, site, entry)
+
+        return value
+
+    return wrapper
+
+
+def close_index():
+    """Close the on-disk index"""
+    id_index.close()
@@ -1,24 +1,57 @@
 # main.py
-import asyncio
+import json
 import logging
+import time
 
 from environs import Env
 from fastapi import FastAPI, Form, HTTPException, Request
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import (
+    PlainTextResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.templating import Jinja2Templates
-from .scraper import (
-    get_imdb_rating,
-    get_rottentomatoes_url,
-    get_rottentomatoes_scores,
-    get_letterboxd_url,
-    get_letterboxd_rating,
-    get_commonsense_info,
-    get_boxofficemojo_url,
-    get_box_office_amounts,
-    get_justwatch_page,
+from markupsafe import Markup
+from pydantic import BaseModel
+from .assets import (
+    AssetFiles,
+    asset_url,
+    check_optional_dependencies,
+    get_static_directory,
+)
+from .cache import close_cache, source_ages
+from .client import close_client, start_client
+from .id_index import close_index
+from .metrics import (
+    RENDER_SECONDS,
+    REQUEST_SECONDS,
+    SERVER_TIMING,
+    format_server_timing,
+    render,
+    server_timings,
+    timer,
+)
+from .pagecache import (
+    DEGRADED_CACHE_CONTROL,
+    PAGE_CACHE_CONTROL,
+    get_page,
+    page_response,
+)
+from .parsing import close_executor
+from .posters import POSTER_CACHE_CONTROL, check_pillow, get_poster
+from .sources import (
+    SOURCES,
+    Execution,
+    format_critical_path,
+    get_unavailable_sites,
+    rate_titles,
 )
 from starlette.middleware.sessions import SessionMiddleware
+from .suggest import close_suggest_index, load_index, record_titles, suggest_titles
 from .tmdb import get_title_details, search_title
+from .utils import format_age
+from .warmer import start_warmer, stop_warmer
 
 # Initialize environment variables
 env = Env()
@@ -27,14 +60,102 @@ env.read_env()
 TMDB_API_KEY = env.str("TMDB_API_KEY")
 SESSION_SECRET_KEY = env.str("SESSION_SECRET_KEY")
 
+# Send the details page header at once and each rating card as it arrives
+STREAM_DETAILS = env.bool("STREAM_DETAILS", False)
+
+# Limits for the bulk ratings API
+BULK_MAX_TITLES = env.int("BULK_MAX_TITLES", 500)
+BULK_CONCURRENCY = env.int("BULK_CONCURRENCY", 8)
+
+# Rating cards on the details page and the sources each one displays
+DETAILS_CARDS = {
+    "commonsense": ["commonsense_info"],
+    "rottentomatoes": ["rottentomatoes_url", "rottentomatoes_scores"],
+    "imdb": ["imdb_rating"],
+    "letterboxd": ["letterboxd_url", "letterboxd_rating"],
+    "box_office": ["boxofficemojo_url", "box_office_amounts"],
+    "justwatch": ["justwatch_page"],
+}
+
 # Initialize FastAPI app
 app = FastAPI()
 
+
+@app.on_event("startup")
+async def startup():
+    """Open shared resources for the lifetime of the app"""
+    check_optional_dependencies()
+    check_pillow()
+    await start_client()
+    await load_index()
+    start_warmer()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Release shared resources"""
+    await stop_warmer()
+    await close_client()
+    close_cache()
+    close_index()
+    close_suggest_index()
+    close_executor()
+
+
 # Mount static files
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.mount("/static", AssetFiles(directory=get_static_directory()), name="static")
 
-# Initialize template engine
+# Initialize template engine, with an async variant for streamed pages
 templates = Jinja2Templates(directory="app/templates")
+stream_templates = Jinja2Templates(directory="app/templates", enable_async=True)
+
+# Resolve static asset URLs to their fingerprinted names
+templates.env.globals["asset_url"] = asset_url
+stream_templates.env.globals["asset_url"] = asset_url
+
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Time each request, and report its stages in a Server-Timing header"""
+    timings = []
+    server_timings.set(timings)
+    started = time.perf_counter()
+
+    response = await call_next(request)
+
+    seconds = time.perf_counter() - started
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(
+        seconds,
+        route=route.path if route else "other",
+        status=response.status_code,
+    )
+
+    if SERVER_TIMING:
+        timings.append(("total", "", seconds))
+        response.headers["Server-Timing"] = format_server_timing(timings)
+
+    return response
+
+
+def render_page(request, name, context, headers=None, degraded=False):
+    """
+    Serve a page from the rendered page cache, rendering it on a miss.
+
+    A degraded page, one missing data that was unavailable, is neither kept
+    in the cache nor marked as reusable by browsers and the CDN.
+
+    """
+
+    def render():
+        with timer(RENDER_SECONDS, "render", name, template=name):
+            return templates.get_template(name).render(context)
+
+    data = {"template": name, **context}
+    page = get_page(request.url.path, data, render, store=not degraded)
+    cache_control = DEGRADED_CACHE_CONTROL if degraded else PAGE_CACHE_CONTROL
+
+    return page_response(request, page, headers, cache_control)
 
 
 @app.exception_handler(HTTPException)
@@ -56,12 +177,12 @@ async def internal_server_error(request: Request, exc: Exception):
 @app.get("/")
 def index(request: Request):
     """Show home page"""
-    return templates.TemplateResponse("index.html", {"request": request})
+    return render_page(request, "index.html", {})
 
 
 @app.get("/search")
 @app.post("/search")
-def search(request: Request, title: str = Form(None)):
+async def search(request: Request, title: str = Form(None)):
     """Search for a movie or TV show and display the results"""
     search_results = []
 
@@ -69,136 +190,179 @@ def search(request: Request, title: str = Form(None)):
         if title:
             user_input = title.strip()
             if user_input:
-                search_results = search_title(user_input)
+                search_results = await search_title(user_input)
+                await record_titles(search_results)
     except Exception:
         raise HTTPException(status_code=500)
 
-    return templates.TemplateResponse(
+    return render_page(
+        request,
         "search.html",
         {
-            "request": request,
             "search_results": search_results,
             "title": title,
         },
     )
 
 
+@app.get("/api/suggest")
+async def suggest(q: str = ""):
+    """Suggest titles as the user types, from titles seen before when possible"""
+    return await suggest_titles(q)
+
+
+@app.get("/img/poster/{size}/{name}")
+async def poster(request: Request, size: str, name: str):
+    """Serve a TMDB poster, resized and cached locally"""
+    webp = "image/webp" in request.headers.get("accept", "")
+
+    try:
+        content, media_type = await get_poster(size, name, webp)
+    except ValueError:
+        raise HTTPException(status_code=404)
+
+    if content is None:
+        return RedirectResponse(asset_url("img/poster-holder.jpg"))
+
+    headers = {"Cache-Control": POSTER_CACHE_CONTROL, "Vary": "Accept"}
+
+    return Response(content, media_type=media_type, headers=headers)
+
+
 @app.get("/details/{tmdb_id}/{media_type}/")
 async def title_details(request: Request, tmdb_id: str, media_type: str):
     """Display detailed information and ratings for the selected title"""
 
+    # Collect how old each served value is, stale values refresh in background
+    ages = {}
+    source_ages.set(ages)
+
     # Fetch title details
-    details = get_title_details(tmdb_id, media_type, TMDB_API_KEY)
-    title = details["title"]
-    year = details["year"]
-    imdb_id = details["imdb_id"]
-    imdb_url = f"https://www.imdb.com/title/{imdb_id}"
-    justwatch_url = details["justwatch_url"]
-
-    # Movie specific tasks
-    if media_type == "Movie":
-        tasks = await execute_movie_tasks(
-            imdb_id, title, year, media_type, justwatch_url
+    details = await get_title_details(tmdb_id, media_type, TMDB_API_KEY)
+    await record_titles([details])
+    imdb_url = f"https://www.imdb.com/title/{details['imdb_id']}"
+
+    # Fetch every source for the media type, each as soon as its inputs resolve
+    execution = Execution(media_type, details)
+    context = {
+        "details": details,
+        "imdb_url": imdb_url,
+        "media_type": media_type,
+        "streaming": STREAM_DETAILS,
+    }
+
+    if STREAM_DETAILS:
+        return StreamingResponse(
+            stream_details(context, execution, ages), media_type="text/html"
         )
 
-    # TV show specific tasks
-    elif media_type == "TV":
-        tasks = await execute_tv_tasks(imdb_id, title, year, media_type, justwatch_url)
+    ratings = await execution.run()
+    oldest_age = max(ages.values(), default=0)
 
-    return templates.TemplateResponse(
+    return render_page(
+        request,
         "details.html",
         {
-            "request": request,
-            "details": details,
-            "imdb_url": imdb_url,
-            "media_type": media_type,
-            **tasks,
+            **context,
+            "ratings_age": format_age(oldest_age) if oldest_age >= 60 else None,
+            "unavailable_sites": get_unavailable_sites(execution.unavailable),
+            **ratings,
+        },
+        headers={
+            "X-Ratings-Age": format_source_ages(ages),
+            "X-Critical-Path": format_critical_path(execution.critical_path()),
         },
+        degraded=bool(execution.unavailable),
     )
 
 
-async def execute_movie_tasks(
-    imdb_id: str, title: str, year: str, media_type: str, justwatch_url: str
-):
-    """Execute asynchronous tasks specifically for movies."""
-    # Initialize tasks
-    boxofficemojo_url = asyncio.create_task(get_boxofficemojo_url(imdb_id))
-    rottentomatoes_url = asyncio.create_task(
-        get_rottentomatoes_url(title, year, media_type)
-    )
-    letterboxd_url = asyncio.create_task(get_letterboxd_url(title, year))
-    justwatch_page = asyncio.create_task(get_justwatch_page(justwatch_url))
-    box_office_amounts = asyncio.create_task(get_box_office_amounts(imdb_id))
-    imdb_rating = asyncio.create_task(get_imdb_rating(imdb_id))
-    commonsense_info = asyncio.create_task(get_commonsense_info(title, year, media_type))
-
-    # Fetch scores immediately after URL is fetched
-    rottentomatoes_url = await rottentomatoes_url
-    rottentomatoes_scores = asyncio.create_task(
-        get_rottentomatoes_scores(rottentomatoes_url)
-    )
+async def stream_details(context, execution, ages):
+    """Render the details page, flushing the header before any rating card"""
+    template = stream_templates.get_template("details.html")
+    cards = stream_cards(context, execution, ages)
 
-    # Fetch rating immediately after URL is fetched
-    letterboxd_url = await letterboxd_url
-    letterboxd_rating = asyncio.create_task(get_letterboxd_rating(letterboxd_url))
-
-    # Await tasks
-    imdb_rating = await imdb_rating
-    boxofficemojo_url = await boxofficemojo_url
-    box_office_amounts = await box_office_amounts
-    commonsense_info = await commonsense_info
-    justwatch_page = await justwatch_page if justwatch_url else None
-    rottentomatoes_scores = await rottentomatoes_scores
-    letterboxd_rating = await letterboxd_rating
-
-    return {
-        "imdb_rating": imdb_rating,
-        "rottentomatoes_url": rottentomatoes_url,
-        "rottentomatoes_scores": rottentomatoes_scores,
-        "letterboxd_url": letterboxd_url,
-        "letterboxd_rating": letterboxd_rating,
-        "commonsense_info": commonsense_info,
-        "boxofficemojo_url": boxofficemojo_url,
-        "box_office_amounts": box_office_amounts,
-        "justwatch_page": justwatch_page,
-    }
+    async for chunk in template.generate_async({**context, "cards": cards}):
+        yield chunk
+
+
+async def stream_cards(context, execution, ages):
+    """Render each rating card as soon as all of its sources have resolved"""
+    source_ages.set(ages)
+    ratings = {source.name: None for source in SOURCES}
+    names = {source.name for source in execution.sources}
+    waiting = {card: set(sources) & names for card, sources in DETAILS_CARDS.items()}
+
+    async def render_card(card, **extra):
+        name = f"partials/_{card}.html"
+
+        with timer(RENDER_SECONDS, "render", name, template=name):
+            partial = stream_templates.get_template(name)
+            html = await partial.render_async({**context, **ratings, **extra})
+
+        return {"name": card, "html": Markup(html)}
 
+    # Cards without sources for this media type can be placed right away
+    for card in [card for card, sources in waiting.items() if not sources]:
+        del waiting[card]
+        yield await render_card(card)
 
-async def execute_tv_tasks(
-    imdb_id: str, title: str, year: str, media_type: str, justwatch_url: str
-):
-    """Execute asynchronous tasks specifically for TV shows."""
-    # Initialize async tasks
-    justwatch_page = asyncio.create_task(get_justwatch_page(justwatch_url))
-    rottentomatoes_url = asyncio.create_task(
-        get_rottentomatoes_url(title, year, media_type)
+    async for name, value in execution.stream():
+        ratings[name] = value
+
+        for card in [card for card, sources in waiting.items() if name in sources]:
+            waiting[card].discard(name)
+
+            if not waiting[card]:
+                del waiting[card]
+                yield await render_card(card)
+
+    oldest_age = max(ages.values(), default=0)
+    yield await render_card(
+        "status",
+        ratings_age=format_age(oldest_age) if oldest_age >= 60 else None,
+        unavailable_sites=get_unavailable_sites(execution.unavailable),
     )
-    imdb_rating = asyncio.create_task(get_imdb_rating(imdb_id))
-    commonsense_info = asyncio.create_task(get_commonsense_info(title, year, media_type))
 
-    # Fetch scores immediately after URL is fetched
-    rottentomatoes_url = await rottentomatoes_url
-    rottentomatoes_scores = asyncio.create_task(
-        get_rottentomatoes_scores(rottentomatoes_url)
+
+def format_source_ages(ages):
+    """Format the age in seconds of each served source for a response header"""
+    return ", ".join(f"{source}={round(age)}" for source, age in sorted(ages.items()))
+
+
+class TitleRef(BaseModel):
+    tmdb_id: str
+    media_type: str
+
+
+class RatingsRequest(BaseModel):
+    titles: list[TitleRef]
+    cache_only: bool = False
+
+
+@app.post("/api/ratings")
+async def bulk_ratings(ratings_request: RatingsRequest):
+    """Stream ratings for many titles as NDJSON, in completion order"""
+    if len(ratings_request.titles) > BULK_MAX_TITLES:
+        raise HTTPException(status_code=413)
+
+    return StreamingResponse(
+        stream_ratings(ratings_request.titles, ratings_request.cache_only),
+        media_type="application/x-ndjson",
     )
 
-    # Await tasks
-    imdb_rating = await imdb_rating
-    commonsense_info = await commonsense_info
-    justwatch_page = await justwatch_page if justwatch_url else None
-    rottentomatoes_scores = await rottentomatoes_scores
-
-    return {
-        "imdb_rating": imdb_rating,
-        "rottentomatoes_url": rottentomatoes_url,
-        "rottentomatoes_scores": rottentomatoes_scores,
-        "commonsense_info": commonsense_info,
-        "justwatch_page": justwatch_page,
-        "letterboxd_url": None,
-        "letterboxd_rating": None,
-        "boxofficemojo_url": None,
-        "box_office_amounts": None,
-    }
+
+async def stream_ratings(titles, only_cached):
+    """Collect ratings for each title with bounded concurrency"""
+    pairs = ((title.tmdb_id, title.media_type) for title in titles)
+
+    async for result in rate_titles(pairs, BULK_CONCURRENCY, only_cached):
+        yield json.dumps(result) + "\n"
+
+
+@app.get("/metrics")
+def metrics():
+    """Expose this worker's metrics in the Prometheus text format"""
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
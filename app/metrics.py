@@ -0,0 +1,237 @@
+# metrics.py
+"""
+Counters and latency histograms for each stage of serving a page.
+
+Metrics are kept per worker process and exposed in the Prometheus text format
+on /metrics. Stage timings for the current request are also collected for the
+response's Server-Timing header.
+"""
+import contextlib
+import math
+import time
+
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from environs import Env
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+# Upper bounds in seconds of the latency histogram buckets
+METRICS_BUCKETS = env.list(
+    "METRICS_BUCKETS",
+    [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0],
+    subcast=float,
+)
+
+# Report each request's stage timings in a Server-Timing response header
+SERVER_TIMING = env.bool("SERVER_TIMING", True)
+
+# Stage timings of the current request, as (stage, description, seconds)
+server_timings = ContextVar("server_timings", default=None)
+
+registry = []
+
+
+def format_labels(labels):
+    """Format label pairs as a Prometheus label set"""
+    if not labels:
+        return ""
+
+    pairs = ",".join(f'{name}="{escape(value)}"' for name, value in labels)
+
+    return "{" + pairs + "}"
+
+
+def escape(value):
+    """Escape a label value for the text format"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic count, one series per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.values = defaultdict(float)
+        registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        self.values[tuple(sorted(labels.items()))] += amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name, labels, value
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets, per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name, description, buckets=METRICS_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = sorted(buckets)
+        self.series = {}
+        registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self.series.get(key)
+
+        if series is None:
+            series = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            self.series[key] = series
+
+        series["counts"][bisect_left(self.buckets, value)] += 1
+        series["sum"] += value
+
+    def samples(self):
+        for labels, series in sorted(self.series.items()):
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + [math.inf], series["counts"]):
+                cumulative += count
+                bucket_labels = labels + (("le", format_value(bound)),)
+                yield f"{self.name}_bucket", bucket_labels, cumulative
+
+            yield f"{self.name}_sum", labels, series["sum"]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Collector:
+    """Metric read from another module's existing stats when scraped"""
+
+    def __init__(self, name, kind, description, collect):
+        self.name = name
+        self.kind = kind
+        self.description = description
+        self.collect = collect
+        registry.append(self)
+
+    def samples(self):
+        for labels, value in self.collect():
+            yield self.name, tuple(sorted(labels.items())), value
+
+
+def register(name, kind, description, collect):
+    """
+    Expose existing stats as a metric.
+
+    Parameters:
+    - name (str): The metric name.
+    - kind (str): "counter" or "gauge".
+    - description (str): Help text for the metric.
+    - collect (callable): Returns (labels dict, value) pairs when scraped.
+
+    """
+    return Collector(name, kind, description, collect)
+
+
+def render():
+    """Render every metric in the Prometheus text exposition format"""
+    lines = []
+
+    for metric in registry:
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def add_timing(stage, seconds, description=""):
+    """Add a stage timing to the current request's Server-Timing header"""
+    timings = server_timings.get()
+
+    if timings is not None:
+        timings.append((stage, description, seconds))
+
+
+@contextlib.contextmanager
+def timer(histogram, stage, description="", **labels):
+    """Time a block into a histogram and the current request's timings"""
+    started = time.perf_counter()
+
+    try:
+        yield
+
+    finally:
+        seconds = time.perf_counter() - started
+        histogram.observe(seconds, **labels)
+        add_timing(stage, seconds, description)
+
+
+def format_server_timing(timings):
+    """Format stage timings as a Server-Timing header value"""
+    entries = []
+
+    for stage, description, seconds in timings:
+        entry = f"{stage};dur={seconds * 1000:.1f}"
+
+        if description:
+            entry += f';desc="{description}"'
+
+        entries.append(entry)
+
+    return ", ".join(entries)
+
+
+# Metrics recorded by the rest of the app
+REQUEST_SECONDS = Histogram(
+    "reelratings_request_seconds", "Time to serve a request, by route and status"
+)
+RENDER_SECONDS = Histogram(
+    "reelratings_render_seconds", "Time to render a template, by template"
+)
+TMDB_SECONDS = Histogram(
+    "reelratings_tmdb_request_seconds", "TMDB API request latency, by endpoint"
+)
+SOURCE_SECONDS = Histogram(
+    "reelratings_source_seconds",
+    "Time to resolve a ratings source including search hops, by source",
+)
+UPSTREAM_SECONDS = Histogram(
+    "reelratings_upstream_request_seconds", "Scraped page request latency, by host"
+)
+PARSE_SECONDS = Histogram(
+    "reelratings_parse_seconds", "Time to parse and extract a page, by source"
+)
+CACHE_LOOKUPS = Counter(
+    "reelratings_cache_lookups_total", "Cached lookups by source and fresh/stale/miss"
+)
+SOURCE_TIMEOUTS = Counter(
+    "reelratings_source_timeouts_total", "Sources that missed their deadline"
+)
+SOURCE_FAILURES = Counter(
+    "reelratings_source_failures_total", "Sources that failed with an error"
+)
+PAGE_CACHE_LOOKUPS = Counter(
+    "reelratings_page_cache_lookups_total", "Rendered page cache hits and misses"
+)
+UPSTREAM_BYTES = Counter(
+    "reelratings_upstream_bytes_total", "Bytes downloaded from scraped hosts"
+)
+UPSTREAM_RESPONSES = Counter(
+    "reelratings_upstream_responses_total",
+    "Scraped pages read in full, drained or cut short past an end marker, "
+    "or not modified",
+)
+POSTER_CACHE_LOOKUPS = Counter(
+    "reelratings_poster_cache_lookups_total", "Poster disk cache hits and misses"
+)
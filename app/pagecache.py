@@ -0,0 +1,177 @@
+# pagecache.py
+import gzip
+import hashlib
+import json
+
+from environs import Env
+from fastapi import Response
+from .cache import MemoryCache
+from .metrics import PAGE_CACHE_LOOKUPS
+
+# Brotli is optional, pages are gzipped when it is not installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+# Rendered pages kept per worker
+PAGE_CACHE_SIZE = env.int("PAGE_CACHE_SIZE", 512)
+
+# Seconds browsers and the CDN may reuse a page, then serve it stale while
+# they revalidate it
+PAGE_MAX_AGE = env.int("PAGE_MAX_AGE", 60)
+PAGE_STALE_WHILE_REVALIDATE = env.int("PAGE_STALE_WHILE_REVALIDATE", 600)
+PAGE_CACHE_CONTROL = env.str(
+    "PAGE_CACHE_CONTROL",
+    f"public, max-age={PAGE_MAX_AGE}, "
+    f"stale-while-revalidate={PAGE_STALE_WHILE_REVALIDATE}",
+)
+
+# Cache-Control for pages missing some ratings, so they are not reused
+DEGRADED_CACHE_CONTROL = env.str("DEGRADED_CACHE_CONTROL", "no-store")
+
+# Pages smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = env.int("COMPRESS_MIN_SIZE", 1024)
+GZIP_LEVEL = env.int("GZIP_LEVEL", 6)
+BROTLI_QUALITY = env.int("BROTLI_QUALITY", 5)
+
+
+class Page:
+    """A rendered page, compressed once per encoding on first request"""
+
+    def __init__(self, body, version):
+        self.body = body
+        self.version = version
+        self.encoded = {None: body}
+
+    def encode(self, encoding):
+        if encoding not in self.encoded:
+            if encoding == "br":
+                self.encoded[encoding] = brotli.compress(
+                    self.body, quality=BROTLI_QUALITY
+                )
+            else:
+                self.encoded[encoding] = gzip.compress(
+                    self.body, compresslevel=GZIP_LEVEL
+                )
+
+        return self.encoded[encoding]
+
+
+rendered_pages = MemoryCache(PAGE_CACHE_SIZE)
+
+
+def get_version(data):
+    """Hash the data a page is rendered from into its version"""
+    encoded = json.dumps(data, sort_keys=True, default=str).encode()
+
+    return hashlib.sha256(encoded).hexdigest()[:24]
+
+
+def get_page(route, data, render, store=True):
+    """
+    Get a rendered page from the cache, rendering it on a miss.
+
+    Pages are keyed by route and by a hash of the data they show, so a page
+    is re-rendered only once the data behind it changes.
+
+    Parameters:
+    - route (str): The request path.
+    - data (dict): Everything the template reads.
+    - render (callable): Renders the page to a string.
+    - store (bool): Whether to keep the page once rendered.
+
+    Returns:
+    - Page: The rendered page.
+
+    """
+    version = get_version(data)
+    key = f"{route}:{version}"
+    page = rendered_pages.get(key)
+
+    if page is None:
+        PAGE_CACHE_LOOKUPS.inc(result="miss")
+        page = Page(render().encode(), version)
+
+        if store:
+            rendered_pages.set(key, page)
+    else:
+        PAGE_CACHE_LOOKUPS.inc(result="hit")
+
+    return page
+
+
+def get_encodings(accept_encoding):
+    """Get the content codings a client accepts, ignoring those with q=0"""
+    encodings = set()
+
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        quality = params.strip().removeprefix("q=")
+
+        try:
+            accepted = float(quality or 1) > 0
+        except ValueError:
+            accepted = True
+
+        if accepted and coding.strip():
+            encodings.add(coding.strip())
+
+    return encodings
+
+
+def choose_encoding(accept_encoding, size):
+    """Pick brotli, then gzip, or no compression for a response"""
+    if size < COMPRESS_MIN_SIZE:
+        return None
+
+    encodings = get_encodings(accept_encoding)
+
+    if brotli is not None and "br" in encodings:
+        return "br"
+
+    if "gzip" in encodings:
+        return "gzip"
+
+    return None
+
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header against a strong ETag"""
+    if not if_none_match:
+        return False
+
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+    return "*" in tags or etag in tags
+
+
+def page_response(request, page, headers=None, cache_control=PAGE_CACHE_CONTROL):
+    """
+    Send a cached page, compressed if the client accepts it.
+
+    GET requests get a strong ETag per encoding and Cache-Control, and are
+    answered with 304 Not Modified when the client already has the page.
+
+    """
+    encoding = choose_encoding(
+        request.headers.get("accept-encoding", ""), len(page.body)
+    )
+    headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+
+    if request.method in ("GET", "HEAD"):
+        etag = f'"{page.version}-{encoding}"' if encoding else f'"{page.version}"'
+        headers["ETag"] = etag
+        headers["Cache-Control"] = cache_control
+
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    return Response(page.encode(encoding), media_type="text/html", headers=headers)
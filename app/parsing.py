@@ -0,0 +1,102 @@
+# parsing.py
+import asyncio
+import functools
+import importlib.util
+import multiprocessing
+import os
+
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from environs import Env
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+# Prefer the C-backed lxml parser when it is installed
+DEFAULT_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+HTML_PARSER = env.str("HTML_PARSER", DEFAULT_PARSER)
+
+# Where parsing and extraction run: "inline" on the event loop, "thread" for
+# GIL-releasing parsers, or "process" to use every core
+PARSE_EXECUTOR = env.str("PARSE_EXECUTOR", "inline")
+PARSE_WORKERS = env.int("PARSE_WORKERS", os.cpu_count() or 1)
+
+_executor = None
+
+
+def parse_html(content, parse_only=None, parser=None):
+    """
+    Parse an HTML document with BeautifulSoup.
+
+    Parameters:
+    - content (bytes): The HTML document.
+    - parse_only (SoupStrainer, optional): Restricts the tree to the matching
+      elements and their descendants, skipping the rest of the page.
+    - parser (str, optional): The parser backend. Defaults to HTML_PARSER.
+
+    Returns:
+    - BeautifulSoup object: The parsed document.
+
+    """
+    return BeautifulSoup(content, parser or HTML_PARSER, parse_only=parse_only)
+
+
+def only(name, attrs=None):
+    """Build a strainer that keeps only the elements an extractor reads"""
+    return SoupStrainer(name, attrs or {})
+
+
+def extract(content, parse_only, extractor, *args):
+    """Parse a page and run an extractor over it, returning only its result"""
+    return extractor(parse_html(content, parse_only), *args)
+
+
+def get_executor():
+    """Return the parse executor, creating it on first use"""
+    global _executor
+
+    if _executor is None:
+        if PARSE_EXECUTOR == "process":
+            # Spawned workers do not inherit the event loop or open sockets
+            _executor = ProcessPoolExecutor(
+                PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        elif PARSE_EXECUTOR == "thread":
+            _executor = ThreadPoolExecutor(PARSE_WORKERS)
+
+    return _executor
+
+
+async def run_extractor(content, parse_only, extractor, *args):
+    """
+    Parse a page and extract a value in the configured parse executor.
+
+    Parameters:
+    - content (bytes): The HTML document.
+    - parse_only (SoupStrainer): Restricts parsing to the elements needed.
+    - extractor (callable): Module-level function taking the parsed page and
+      args. It must be picklable when PARSE_EXECUTOR is "process".
+    - args: Extra arguments passed to the extractor.
+
+    Returns:
+    - The value returned by the extractor.
+
+    """
+    executor = get_executor()
+
+    if executor is None:
+        return extract(content, parse_only, extractor, *args)
+
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, functools.partial(extract, content, parse_only, extractor, *args)
+    )
+
+
+def close_executor():
+    """Shut down the parse executor and its workers"""
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
@@ -0,0 +1,242 @@
+# posters.py
+import asyncio
+import io
+import logging
+import os
+import re
+import threading
+
+import httpx
+
+from environs import Env
+from .client import get_client
+from .metrics import POSTER_CACHE_LOOKUPS
+from .singleflight import single_flight
+
+# Pillow is optional, posters are served at TMDB's own sizes without it
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+# Serve posters through /img/poster instead of hotlinking TMDB
+POSTER_PROXY = env.bool("POSTER_PROXY", True)
+
+# TMDB image root, overridable to point at a local stand-in
+TMDB_IMAGE_URL = env.str("TMDB_IMAGE_URL", "https://image.tmdb.org/t/p")
+
+# On-disk poster cache shared by all workers, evicted oldest first past its size
+POSTER_CACHE_DIR = env.str("POSTER_CACHE_DIR", "poster-cache")
+POSTER_CACHE_MAX_BYTES = env.int("POSTER_CACHE_MAX_BYTES", 500 * 1024 * 1024)
+POSTER_QUALITY = env.int("POSTER_QUALITY", 80)
+POSTER_TIMEOUT = env.float("POSTER_TIMEOUT", 10.0)
+
+# Poster widths served, and the TMDB size every variant is resized from
+POSTER_WIDTHS = {"w92": 92, "w185": 185, "w342": 342, "w500": 500}
+SOURCE_SIZE = "w500"
+
+# Cache folder of the TMDB originals, kept apart from the resized variants
+SOURCE_FOLDER = os.path.join("source", SOURCE_SIZE)
+
+POSTER_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# TMDB file names, e.g. "/kJr6…Uv.jpg"
+POSTER_NAME = re.compile(r"^[A-Za-z0-9_-]+\.(jpg|jpeg|png)$")
+
+
+class PosterCache:
+    """Directory of poster files, trimmed oldest first once over max_bytes"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.used = None
+
+    def get_path(self, size, name):
+        return os.path.join(self.directory, size, name)
+
+    def get(self, size, name):
+        path = self.get_path(size, name)
+
+        try:
+            with open(path, "rb") as file:
+                content = file.read()
+
+        except FileNotFoundError:
+            return None
+
+        # Mark the file as recently used so eviction keeps it
+        os.utime(path)
+
+        return content
+
+    def set(self, size, name, content):
+        path = self.get_path(size, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write then rename, so other workers never read a partial file
+        temporary = f"{path}.{os.getpid()}.tmp"
+
+        with open(temporary, "wb") as file:
+            file.write(content)
+
+        os.replace(temporary, path)
+
+        with self.lock:
+            if self.used is None:
+                self.used = sum(size for _, size, _ in self.scan())
+
+            self.used += len(content)
+
+            if self.used > self.max_bytes:
+                self.evict()
+
+    def scan(self):
+        """List (path, size, last used) for every cached file"""
+        files = []
+
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+                files.append((path, stat.st_size, stat.st_mtime))
+
+        return files
+
+    def evict(self):
+        """Delete the least recently used files down to 90% of max_bytes"""
+        files = sorted(self.scan(), key=lambda file: file[2])
+        self.used = sum(size for _, size, _ in files)
+
+        for path, size, _ in files:
+            if self.used <= self.max_bytes * 0.9:
+                break
+
+            try:
+                os.remove(path)
+                self.used -= size
+            except FileNotFoundError:
+                pass
+
+
+poster_cache = PosterCache(POSTER_CACHE_DIR, POSTER_CACHE_MAX_BYTES)
+
+
+def check_pillow():
+    """Warn when posters are passed through without resizing or WebP"""
+    if POSTER_PROXY and Image is None:
+        logging.warning("Pillow is not installed, posters are served unresized")
+
+
+def poster_url(size, poster_path):
+    """Get the URL a page should use for a TMDB poster path"""
+    if POSTER_PROXY:
+        return f"/img/poster/{size}{poster_path}"
+
+    return f"{TMDB_IMAGE_URL}/{size}{poster_path}"
+
+
+async def download(size, name, folder=None):
+    """Fetch a poster from TMDB once and store it, by default under its size"""
+    folder = folder or size
+    content = await asyncio.to_thread(poster_cache.get, folder, name)
+
+    if content is None:
+        POSTER_CACHE_LOOKUPS.inc(result="download")
+        response = await get_client().get(
+            f"{TMDB_IMAGE_URL}/{size}/{name}", timeout=POSTER_TIMEOUT
+        )
+        response.raise_for_status()
+        content = response.content
+        await asyncio.to_thread(poster_cache.set, folder, name, content)
+
+    return content
+
+
+def resize(content, width, image_format):
+    """Scale a poster down to a width and re-encode it"""
+    with Image.open(io.BytesIO(content)) as image:
+        image.thumbnail((width, width * 3))
+        output = io.BytesIO()
+
+        if image_format == "WEBP":
+            image.save(output, "WEBP", quality=POSTER_QUALITY, method=4)
+        else:
+            image.convert("RGB").save(
+                output, "JPEG", quality=POSTER_QUALITY, optimize=True
+            )
+
+    return output.getvalue()
+
+
+async def render_variant(size, name, webp):
+    """Resize the source poster to a size, caching the result"""
+    extension = "webp" if webp else "jpg"
+    variant = f"{name.rsplit('.', 1)[0]}.{extension}"
+    content = await asyncio.to_thread(poster_cache.get, size, variant)
+    POSTER_CACHE_LOOKUPS.inc(result="miss" if content is None else "hit")
+
+    if content is None:
+        source = await single_flight(
+            f"poster:{SOURCE_FOLDER}/{name}", download, SOURCE_SIZE, name, SOURCE_FOLDER
+        )
+        image_format = "WEBP" if webp else "JPEG"
+        content = await asyncio.to_thread(
+            resize, source, POSTER_WIDTHS[size], image_format
+        )
+        await asyncio.to_thread(poster_cache.set, size, variant, content)
+
+    return content
+
+
+async def get_poster(size, name, webp=False):
+    """
+    Get a poster at one of POSTER_WIDTHS, from the disk cache when possible.
+
+    With Pillow installed every size is resized from a single download and
+    re-encoded, as WebP when the client accepts it. Without Pillow, TMDB's
+    own rendition of the size is downloaded and cached as it is.
+
+    Parameters:
+    - size (str): A key of POSTER_WIDTHS, e.g. "w185".
+    - name (str): The TMDB poster file name.
+    - webp (bool): Whether the client accepts WebP.
+
+    Returns:
+    - tuple: The image bytes and their media type, or (None, None) if the
+      poster could not be fetched.
+
+    Raises:
+    - ValueError: If the size or name is not one the proxy serves.
+
+    """
+    if size not in POSTER_WIDTHS or not POSTER_NAME.match(name):
+        raise ValueError(f"Not a poster: {size}/{name}")
+
+    try:
+        if Image is None:
+            content = await single_flight(f"poster:{size}/{name}", download, size, name)
+            media_type = "image/png" if name.endswith(".png") else "image/jpeg"
+
+            return content, media_type
+
+        content = await single_flight(
+            f"poster:{size}/{name}:{webp}", render_variant, size, name, webp
+        )
+
+        return content, "image/webp" if webp else "image/jpeg"
+
+    except (httpx.HTTPError, OSError) as exc:
+        logging.error(f"Poster {size}/{name} unavailable: {exc!r}")
+
+        return None, None
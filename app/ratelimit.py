@@ -0,0 +1,161 @@
+# ratelimit.py
+import asyncio
+import contextlib
+import heapq
+import itertools
+import time
+
+from collections import defaultdict
+from contextvars import ContextVar
+from environs import Env
+from urllib.parse import urlsplit
+from .metrics import register
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+# Default per-host limits: requests per second, burst size and concurrency cap
+HOST_RATE = env.float("HOST_RATE", 5.0)
+HOST_BURST = env.int("HOST_BURST", 10)
+HOST_CONCURRENCY = env.int("HOST_CONCURRENCY", 6)
+
+# Per-host request rate overrides, e.g. "www.imdb.com=10,letterboxd.com=2"
+HOST_RATE_LIMITS = env.dict("HOST_RATE_LIMITS", {}, subcast_values=float)
+
+# Lower values are served first: interactive page views ahead of background
+# refreshes and prefetching
+INTERACTIVE = 0
+BACKGROUND = 1
+
+priority = ContextVar("priority", default=INTERACTIVE)
+
+# Time spent queued per host, in seconds
+wait_stats = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0})
+
+
+class HostLimiter:
+    """
+    Token bucket plus concurrency cap for one upstream host.
+
+    Callers queue by priority, then arrival order, and are let through when a
+    token and a concurrency slot are both available.
+
+    """
+
+    def __init__(self, rate, burst, concurrency):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.active = 0
+        self.waiters = []
+        self.sequence = itertools.count()
+        self.timer = None
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def has_token(self):
+        return self.rate <= 0 or self.tokens >= 1
+
+    def on_timer(self):
+        self.timer = None
+        self.wake()
+
+    def wake(self):
+        """Let through as many queued callers as tokens and slots allow"""
+        self.refill()
+
+        while self.waiters and self.active < self.concurrency and self.has_token():
+            _, _, future = heapq.heappop(self.waiters)
+
+            # Skip callers that gave up while queued
+            if future.done():
+                continue
+
+            self.tokens -= 1
+            self.active += 1
+            future.set_result(None)
+
+        # Come back when the next token is due, unless a timer already will
+        if self.waiters and self.active < self.concurrency and self.timer is None:
+            delay = (1 - self.tokens) / self.rate
+            self.timer = asyncio.get_running_loop().call_later(delay, self.on_timer)
+
+    async def acquire(self, priority):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.sequence), future))
+        self.wake()
+
+        try:
+            await future
+
+        except asyncio.CancelledError:
+            # Give back a slot granted just before the caller was cancelled
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.active -= 1
+        self.wake()
+
+
+limiters = {}
+
+
+def get_limiter(host):
+    """Return the limiter for a host, creating it on first use"""
+    if host not in limiters:
+        rate = HOST_RATE_LIMITS.get(host, HOST_RATE)
+        limiters[host] = HostLimiter(rate, HOST_BURST, HOST_CONCURRENCY)
+
+    return limiters[host]
+
+
+register(
+    "reelratings_ratelimit_waits_total",
+    "counter",
+    "Requests queued behind a host's rate limit",
+    lambda: [({"host": host}, stats["count"]) for host, stats in wait_stats.items()],
+)
+register(
+    "reelratings_ratelimit_wait_seconds_total",
+    "counter",
+    "Time requests spent queued behind a host's rate limit",
+    lambda: [({"host": host}, stats["total"]) for host, stats in wait_stats.items()],
+)
+register(
+    "reelratings_ratelimit_queued",
+    "gauge",
+    "Requests currently queued for a host",
+    lambda: [({"host": host}, len(lim.waiters)) for host, lim in limiters.items()],
+)
+
+
+def record_wait(host, seconds):
+    stats = wait_stats[host]
+    stats["count"] += 1
+    stats["total"] += seconds
+    stats["max"] = max(stats["max"], seconds)
+
+
+@contextlib.asynccontextmanager
+async def limit(url):
+    """Hold a rate-limited slot for the URL's host while a request runs"""
+    host = urlsplit(url).hostname
+    limiter = get_limiter(host)
+
+    queued = time.perf_counter()
+    await limiter.acquire(priority.get())
+    record_wait(host, time.perf_counter() - queued)
+
+    try:
+        yield
+
+    finally:
+        limiter.release()
@@ -1,14 +1,54 @@
 # scraping.py
+import asyncio
 import httpx
 import json
 import logging
+import time
 
-from bs4 import BeautifulSoup
+from environs import Env
 from fastapi import HTTPException
 from unidecode import unidecode
-
-
-BASE_URLS = {
+from urllib.parse import urljoin, urlsplit
+from .breaker import check, record_failure, record_success
+from .cache import (
+    CACHE_GRACE,
+    CACHE_TTLS,
+    Entry,
+    cached,
+    disk_cache,
+    make_key,
+    prune_entries,
+)
+from .client import get_client
+from .hedging import hedged
+from .metrics import (
+    PARSE_SECONDS,
+    UPSTREAM_BYTES,
+    UPSTREAM_RESPONSES,
+    UPSTREAM_SECONDS,
+    timer,
+)
+from .parsing import only, run_extractor
+from .ratelimit import limit
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+# Upper bound in seconds on a single upstream request
+SCRAPER_TIMEOUT = env.float("SCRAPER_TIMEOUT", 15.0)
+
+# Stop downloading a page once its source's end marker has been read
+EARLY_ABORT = env.bool("EARLY_ABORT", True)
+
+# Bytes still worth reading past the marker on HTTP/1.1, where stopping early
+# closes the connection; about what a new TLS connection costs to set up
+EARLY_ABORT_DRAIN_BYTES = env.int("EARLY_ABORT_DRAIN_BYTES", 64 * 1024)
+
+# Revalidate pages with stored ETag/Last-Modified validators
+CONDITIONAL_REQUESTS = env.bool("CONDITIONAL_REQUESTS", True)
+
+DEFAULT_BASE_URLS = {
     "rottentomatoes": "https://www.rottentomatoes.com/search?search=",
     "letterboxd": "https://letterboxd.com/search/",
     "commonsensemedia": "https://www.commonsensemedia.org/search/",
@@ -16,6 +56,12 @@ BASE_URLS = {
     "boxofficemojo": "https://www.boxofficemojo.com/title/",
 }
 
+# Each overridable with BASE_URL_<SITE>, e.g. to point at local stand-ins
+BASE_URLS = {
+    site: env.str(f"BASE_URL_{site.upper()}", url)
+    for site, url in DEFAULT_BASE_URLS.items()
+}
+
 HEADERS = {
     "User-Agent": (
         "Mozilla/5.0 (X11; Linux x86_64; rv:12.0) " "Gecko/20100101 Firefox/12.0"
@@ -26,39 +72,173 @@ HEADERS = {
     "Referer": "https://www.google.com",
 }
 
+# The only elements each extractor reads, so the rest of the page is skipped
+STRAINERS = {
+    "rottentomatoes_url": only("search-page-media-row"),
+    "rottentomatoes_scores": only("script", {"id": "media-scorecard-json"}),
+    "letterboxd_url": only("span", {"class": "film-title-wrapper"}),
+    "letterboxd_rating": only("meta", {"name": "twitter:data2"}),
+    "commonsense_info": only("div", {"class": "site-search-teaser"}),
+    "imdb_rating": only(
+        "div", {"data-testid": "hero-rating-bar__aggregate-rating__score"}
+    ),
+    "box_office_amounts": only("span", {"class": "a-size-medium a-text-bold"}),
+    "justwatch_page": only("div", {"class": "homepage"}),
+}
 
-async def make_request(url, headers=None):
+# Byte strings that appear in order once everything an extractor reads has
+# arrived, so the rest of the page is never downloaded. Sources whose
+# elements are spread over the whole page have none.
+END_MARKERS = {
+    "rottentomatoes_scores": (b'id="media-scorecard-json"', b"</script>"),
+    "letterboxd_rating": (b"</head>",),
+    "imdb_rating": (
+        b'data-testid="hero-rating-bar__aggregate-rating__score"',
+        b"</div>",
+    ),
+}
+
+
+async def drain(response, chunks):
+    """
+    Read the rest of a body if little is left, so its connection is reused.
+
+    HTTP/2 cancels just the stream and keeps the connection, so nothing is
+    read there. On HTTP/1.1 an unread body closes the connection, which
+    costs more than the last few kilobytes of a page.
+
+    Returns:
+    - bool: Whether the body was read to the end.
+
+    """
+    if response.http_version != "HTTP/1.1":
+        return False
+
+    started = response.num_bytes_downloaded
+    length = response.headers.get("content-length", "")
+
+    if length.isdigit() and int(length) - started > EARLY_ABORT_DRAIN_BYTES:
+        return False
+
+    async for _ in chunks:
+        if response.num_bytes_downloaded - started > EARLY_ABORT_DRAIN_BYTES:
+            return False
+
+    return True
+
+
+async def read_body(response, marker=None):
+    """
+    Read a response body, stopping early once an end marker has been seen.
+
+    Parameters:
+    - response (httpx.Response): A streamed response.
+    - marker (tuple, optional): Byte strings that appear in this order once
+      everything an extractor needs has arrived.
+
+    Returns:
+    - tuple: The body, cut just after the marker if it was seen, and how the
+      download ended: "full", "drained" when the rest was read to keep the
+      connection, or "cut_short".
+
+    """
+    body = bytearray()
+    parts = list(marker or ())
+    start = scanned = 0
+    chunks = response.aiter_bytes()
+
+    async for chunk in chunks:
+        body += chunk
+
+        # Search only new bytes, plus enough overlap for a split marker
+        while parts:
+            index = body.find(parts[0], max(start, scanned - len(parts[0]) + 1))
+
+            if index == -1:
+                scanned = len(body)
+                break
+
+            start = scanned = index + len(parts[0])
+            parts.pop(0)
+
+        if marker and not parts:
+            drained = await drain(response, chunks)
+
+            return bytes(body[:start]), "drained" if drained else "cut_short"
+
+    return bytes(body), "full"
+
+
+async def download(url, headers=None, marker=None):
     """
-    Make an asynchronous HTTP GET request and parse the content with BeautifulSoup.
+    Make an asynchronous HTTP GET request, streaming the page content.
 
     Parameters:
     - url (str): The URL to request.
     - headers (dict, optional): Any HTTP headers to include in the request.
+    - marker (tuple, optional): End marker to stop reading at, see read_body.
 
     Returns:
-    - BeautifulSoup object: The HTML content of the response parsed by BeautifulSoup.
+    - tuple: The response and its content, which is empty for 304 Not Modified.
 
     Raises:
+    - SourceUnavailable: If the URL recently failed or its host's circuit is open.
     - HTTPException: If the request fails or returns a non-2xx HTTP status code.
 
     """
+    # Fail fast rather than wait on a host that keeps failing
+    check(url)
 
     try:
-        # Create an asynchronous HTTP client
-        async with httpx.AsyncClient() as client:
-            # Make the HTTP GET request
-            response = await client.get(
-                url, headers=headers, timeout=15, follow_redirects=True
-            )
-
+        # Reuse the app-lifetime client and its pooled connections
+        client = get_client()
+        host = urlsplit(url).hostname
+
+        async def attempt():
+            # Make the HTTP GET request once the host's rate limit allows it
+            async with limit(url):
+                with timer(UPSTREAM_SECONDS, "fetch", host, host=host):
+                    async with client.stream(
+                        "GET", url, headers=headers, timeout=SCRAPER_TIMEOUT
+                    ) as response:
+                        # Error bodies are never read, they are not parsed
+                        if not response.is_success:
+                            return response, b""
+
+                        content, outcome = await read_body(
+                            response, marker if EARLY_ABORT else None
+                        )
+
+            UPSTREAM_RESPONSES.inc(host=host, outcome=outcome)
+
+            return response, content
+
+        # Hedge slow requests to tail-latency-heavy hosts
+        response, content = await hedged(url, attempt)
+        UPSTREAM_BYTES.inc(len(content), host=host)
+
+        if response.status_code == 304:
+            UPSTREAM_RESPONSES.inc(host=host, outcome="not_modified")
+        else:
             # Check that the request was successful (status code 2xx)
             response.raise_for_status()
 
-            # Parse the HTML content of the response with BeautifulSoup
-            return BeautifulSoup(response.content, "html.parser")
+        record_success(url)
+
+        return response, content
+
+    except httpx.HTTPStatusError as exc:
+        # Only server errors and rate limiting count against the host
+        status_code = exc.response.status_code
+        record_failure(url, host_error=status_code >= 500 or status_code == 429)
+        logging.error(f"HTTPX Status Error: {exc}")
+
+        # Raise a FastAPI HTTPException with a 500 status code
+        raise HTTPException(status_code=500, detail="Internal Server Error")
 
     except httpx.RequestError as exc:
         # Log any exception specific to HTTPX
+        record_failure(url)
         logging.error(f"HTTPX Request Error: {exc}")
 
         # Raise a FastAPI HTTPException with a 500 status code
@@ -72,12 +252,96 @@ async def make_request(url, headers=None):
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+async def make_request(url, headers=None):
+    """Make an asynchronous HTTP GET request and return the whole page content"""
+    _, content = await download(url, headers)
+
+    return content
+
+
+def get_conditional_headers(validators):
+    """Build If-None-Match/If-Modified-Since headers from stored validators"""
+    headers = {}
+
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    return headers
+
+
+def is_current(source, validators):
+    """Check whether validators are within their source's TTL and grace"""
+    return time.time() - validators.stored_at < CACHE_TTLS[source] + CACHE_GRACE
+
+
+async def scrape(source, url, extractor, *args):
+    """
+    Fetch a page and extract the value a source needs from it.
+
+    The fetch runs on the event loop; parsing and extraction run in the
+    configured parse executor, and only the extracted value comes back.
+    The page's validators are stored with the extracted value for the
+    source's TTL and grace, so a fetch within that time is conditional and a
+    304 Not Modified reuses that value unparsed.
+
+    Parameters:
+    - source (str): The name of the source, used to pick its strainer.
+    - url (str): The URL to request.
+    - extractor (callable): Module-level function taking the parsed page
+      and args, returning a small picklable value.
+    - args: Extra arguments passed to the extractor.
+
+    """
+    key = make_key(f"{source}_validators", url, *args)
+    headers = HEADERS
+    validators = None
+
+    if CONDITIONAL_REQUESTS:
+        validators = await asyncio.to_thread(disk_cache.get, key)
+
+        # Past the cache's own lifetime the page is parsed afresh
+        if validators is not None and not is_current(source, validators):
+            validators = None
+
+        if validators is not None:
+            headers = {**HEADERS, **get_conditional_headers(validators.value)}
+
+    response, content = await download(url, headers, END_MARKERS.get(source))
+
+    if response.status_code == 304 and validators is not None:
+        return validators.value["value"]
+
+    with timer(PARSE_SECONDS, "parse", source, source=source):
+        value = await run_extractor(content, STRAINERS[source], extractor, *args)
+
+    etag = response.headers.get("etag")
+    last_modified = response.headers.get("last-modified")
+
+    if CONDITIONAL_REQUESTS and (etag or last_modified):
+        stored = {"etag": etag, "last_modified": last_modified, "value": value}
+        await asyncio.to_thread(disk_cache.set, key, Entry(stored, time.time()))
+        await prune_entries(f"{source}_validators", CACHE_TTLS[source] + CACHE_GRACE)
+
+    return value
+
+
+@cached("rottentomatoes_url")
 async def get_rottentomatoes_url(title, year, media_type):
     """Extract the RottenTomatoes URL for the title"""
     title = unidecode(title)
     year = year[:4]
     search_url = f"{BASE_URLS['rottentomatoes']}{title.replace(' ', '%20')}"
-    soup = await make_request(search_url, HEADERS)
+
+    return await scrape(
+        "rottentomatoes_url", search_url, extract_rottentomatoes_url, year, media_type
+    )
+
+
+def extract_rottentomatoes_url(soup, year, media_type):
+    """Extract the title's URL from a RottenTomatoes search page"""
     search_result = soup.find(
         "search-page-media-row",
         {"releaseyear": {year}} if media_type == "Movie" else {"startyear": {year}},
@@ -92,10 +356,16 @@ async def get_rottentomatoes_url(title, year, media_type):
         return None
 
 
+@cached("letterboxd_url")
 async def get_letterboxd_url(title, year):
     """Extract the Letterboxd URL for the movie"""
     search_url = f"{BASE_URLS['letterboxd']}{title.replace(' ', '+')}/"
-    soup = await make_request(search_url, HEADERS)
+
+    return await scrape("letterboxd_url", search_url, extract_letterboxd_url, year)
+
+
+def extract_letterboxd_url(soup, year):
+    """Extract the movie's URL from a Letterboxd search page"""
     search_results = soup.find_all("span", {"class": "film-title-wrapper"})
 
     for result in search_results:
@@ -106,15 +376,23 @@ async def get_letterboxd_url(title, year):
         if year_element and year_element.text.strip() == year:
             href = result.find("a")["href"]
 
-            return f"https://letterboxd.com{href}"
+            return urljoin(BASE_URLS["letterboxd"], href)
 
     return None
 
 
+@cached("commonsense_info")
 async def get_commonsense_info(title, year, media_type):
     """Extract the title's specific URL page and age rating"""
     search_url = f"{BASE_URLS['commonsensemedia']}{title.replace(' ', '%20')}"
-    soup = await make_request(search_url, HEADERS)
+
+    return await scrape(
+        "commonsense_info", search_url, extract_commonsense_info, year, media_type
+    )
+
+
+def extract_commonsense_info(soup, year, media_type):
+    """Extract the title's URL and age rating from a Common Sense search page"""
     search_results = soup.find_all("div", {"class": "site-search-teaser"})
 
     for result in search_results:
@@ -146,71 +424,93 @@ async def get_commonsense_info(title, year, media_type):
             continue
 
         return {
-            "url": f"https://www.commonsensemedia.org{href}",
+            "url": urljoin(BASE_URLS["commonsensemedia"], href),
             "rating": rating_age,
         }
 
     return None
 
 
+@cached("imdb_rating")
 async def get_imdb_rating(imdb_id):
     """Extract the average user rating"""
     if imdb_id:
         imdb_url = f"{BASE_URLS['imdb']}{imdb_id}"
-        soup = await make_request(imdb_url, HEADERS)
-
-        # Locate the class that contains the IMDb Rating
-        rating = soup.find(
-            "div", {"data-testid": "hero-rating-bar__aggregate-rating__score"}
-        )
 
-        return rating.text[:-3] if rating else None
+        return await scrape("imdb_rating", imdb_url, extract_imdb_rating)
 
     else:
         return None
 
 
+def extract_imdb_rating(soup):
+    """Extract the average user rating from an IMDb title page"""
+    # Locate the class that contains the IMDb Rating
+    rating = soup.find(
+        "div", {"data-testid": "hero-rating-bar__aggregate-rating__score"}
+    )
+
+    return rating.text[:-3] if rating else None
+
+
 async def get_boxofficemojo_url(imdb_id):
     boxofficemojo_url = f"{BASE_URLS['boxofficemojo']}{imdb_id}/"
 
     return boxofficemojo_url
 
 
+@cached("box_office_amounts")
 async def get_box_office_amounts(imdb_id):
     """Extract box office amounts"""
     if imdb_id:
         url = f"{BASE_URLS['boxofficemojo']}{imdb_id}/"
-        soup = await make_request(url, HEADERS)
-        # Locate the span element that contains the Box Office amounts
-        span_elements = soup.find_all("span", class_="a-size-medium a-text-bold")
-        dollar_amounts = [span.get_text(strip=True) for span in span_elements]
 
-        return dollar_amounts
+        return await scrape("box_office_amounts", url, extract_box_office_amounts)
 
     else:
         return None
 
 
+def extract_box_office_amounts(soup):
+    """Extract box office amounts from a Box Office Mojo title page"""
+    # Locate the span element that contains the Box Office amounts
+    span_elements = soup.find_all("span", class_="a-size-medium a-text-bold")
+    dollar_amounts = [span.get_text(strip=True) for span in span_elements]
+
+    return dollar_amounts
+
+
+@cached("justwatch_page")
 async def get_justwatch_page(justwatch_url):
     """Extract the JustWatch page url for 'US'"""
     if justwatch_url:
-        soup = await make_request(justwatch_url, HEADERS)
+        return await scrape("justwatch_page", justwatch_url, extract_justwatch_page)
+
 
-        try:
-            link = soup.find("div", class_="homepage")
-        except AttributeError:
-            link = None
+def extract_justwatch_page(soup):
+    """Extract the JustWatch link from a TMDB watch page"""
+    try:
+        link = soup.find("div", class_="homepage")
+    except AttributeError:
+        link = None
 
-        return link.find("a")["href"] if link else None
+    return link.find("a")["href"] if link else None
 
 
+@cached("rottentomatoes_scores")
 async def get_rottentomatoes_scores(rottentomatoes_url):
     """Extract Tomotometer and Audience Scores"""
     if not rottentomatoes_url:
         return None
 
+    return await scrape(
+        "rottentomatoes_scores", rottentomatoes_url, extract_rottentomatoes_scores
+    )
+
+
+def extract_rottentomatoes_scores(soup):
+    """Extract Tomatometer and Audience Scores from a RottenTomatoes title page"""
     # Get the script element that contains the Tomatometer and Audience scores
-    soup = await make_request(rottentomatoes_url, HEADERS)
     script_tag = soup.find("script", {"id": "media-scorecard-json"})
 
     if not script_tag:
@@ -251,13 +551,17 @@ async def get_rottentomatoes_scores(rottentomatoes_url):
     }
 
 
+@cached("letterboxd_rating")
 async def get_letterboxd_rating(letterboxd_url):
     """Extract the average user rating"""
     if not letterboxd_url:
         return None
 
-    soup = await make_request(letterboxd_url, HEADERS)
+    return await scrape("letterboxd_rating", letterboxd_url, extract_letterboxd_rating)
+
 
+def extract_letterboxd_rating(soup):
+    """Extract the average user rating from a Letterboxd film page"""
     # Locate the class that contains the Tomatometer and Audience scores
     try:
         rating = soup.find("meta", {"name": "twitter:data2"}).get("content")
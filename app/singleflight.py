@@ -0,0 +1,58 @@
+# singleflight.py
+import asyncio
+
+from .metrics import register
+
+# In-flight lookups by key, shared by every concurrent caller
+inflight = {}
+
+# Counters for lookups started and callers that joined an in-flight lookup
+stats = {"started": 0, "deduplicated": 0}
+
+register(
+    "reelratings_singleflight_lookups_total",
+    "counter",
+    "Cached lookups started, and callers that joined one already in flight",
+    lambda: [({"outcome": outcome}, count) for outcome, count in stats.items()],
+)
+
+
+def forget(key, task):
+    """Drop a finished lookup so the next caller starts a new one"""
+    if inflight.get(key) is task:
+        del inflight[key]
+
+    # Mark the exception as retrieved even when no caller is left to await it
+    if not task.cancelled():
+        task.exception()
+
+
+async def single_flight(key, func, *args):
+    """
+    Run an async lookup once per key, however many callers ask concurrently.
+
+    Callers arriving while a lookup for the same key is in flight await its
+    result (or exception) instead of starting their own. The lookup is
+    shielded, so one caller being cancelled does not cancel it for the rest.
+
+    Parameters:
+    - key (str): Identifies the lookup, e.g. the source and normalized URL.
+    - func (callable): The coroutine function to run.
+    - args: Arguments passed to func.
+
+    Returns:
+    - The result of the shared lookup.
+
+    """
+    task = inflight.get(key)
+
+    if task is None:
+        stats["started"] += 1
+        task = asyncio.create_task(func(*args))
+        inflight[key] = task
+        task.add_done_callback(lambda done: forget(key, done))
+
+    else:
+        stats["deduplicated"] += 1
+
+    return await asyncio.shield(task)
@@ -0,0 +1,359 @@
+# sources.py
+import asyncio
+import logging
+import time
+
+from collections import namedtuple
+from environs import Env
+from .cache import CacheMiss, cache_only
+from .id_index import indexed
+from .metrics import SOURCE_FAILURES, SOURCE_SECONDS, SOURCE_TIMEOUTS, add_timing
+from .ratelimit import BACKGROUND, priority
+from .scraper import (
+    get_imdb_rating,
+    get_rottentomatoes_url,
+    get_rottentomatoes_scores,
+    get_letterboxd_url,
+    get_letterboxd_rating,
+    get_commonsense_info,
+    get_boxofficemojo_url,
+    get_box_office_amounts,
+    get_justwatch_page,
+)
+from .tmdb import TMDB_API_KEY, get_title_details
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+# Total latency budget in seconds for all sources of one details page
+DETAILS_BUDGET = env.float("DETAILS_BUDGET", 10.0)
+
+# Default deadline in seconds per source, overridable with SOURCE_TIMEOUT_<NAME>
+SOURCE_TIMEOUT = env.float("SOURCE_TIMEOUT", 8.0)
+
+MOVIE = "Movie"
+TV = "TV"
+
+# A source node: its fetch function, the names of the inputs passed to it in
+# order, and the media types it applies to. An input naming another source is
+# a dependency; any other input comes from the title details. Sources that
+# search a site for the title resolve through the durable ID index first.
+Source = namedtuple("Source", ["name", "func", "inputs", "media_types"])
+
+SOURCES = [
+    Source("imdb_rating", get_imdb_rating, ["imdb_id"], {MOVIE, TV}),
+    Source(
+        "rottentomatoes_url",
+        indexed("rottentomatoes_url", get_rottentomatoes_url),
+        ["title_key", "title", "year", "media_type"],
+        {MOVIE, TV},
+    ),
+    Source(
+        "rottentomatoes_scores",
+        get_rottentomatoes_scores,
+        ["rottentomatoes_url"],
+        {MOVIE, TV},
+    ),
+    Source(
+        "letterboxd_url",
+        indexed("letterboxd_url", get_letterboxd_url),
+        ["title_key", "title", "year"],
+        {MOVIE},
+    ),
+    Source("letterboxd_rating", get_letterboxd_rating, ["letterboxd_url"], {MOVIE}),
+    Source(
+        "commonsense_info",
+        indexed("commonsense_info", get_commonsense_info),
+        ["title_key", "title", "year", "media_type"],
+        {MOVIE, TV},
+    ),
+    Source("boxofficemojo_url", get_boxofficemojo_url, ["imdb_id"], {MOVIE}),
+    Source("box_office_amounts", get_box_office_amounts, ["imdb_id"], {MOVIE}),
+    Source("justwatch_page", get_justwatch_page, ["justwatch_url"], {MOVIE, TV}),
+]
+
+SOURCES_BY_NAME = {source.name: source for source in SOURCES}
+
+SOURCE_DEADLINES = {
+    source.name: env.float(f"SOURCE_TIMEOUT_{source.name.upper()}", SOURCE_TIMEOUT)
+    for source in SOURCES
+}
+
+# Site shown to the user when a source is unavailable
+SOURCE_SITES = {
+    "imdb_rating": "IMDb",
+    "rottentomatoes_url": "Rotten Tomatoes",
+    "rottentomatoes_scores": "Rotten Tomatoes",
+    "letterboxd_url": "Letterboxd",
+    "letterboxd_rating": "Letterboxd",
+    "commonsense_info": "Common Sense Media",
+    "boxofficemojo_url": "Box Office Mojo",
+    "box_office_amounts": "Box Office Mojo",
+    "justwatch_page": "JustWatch",
+}
+
+
+def get_sources(media_type):
+    """Get the sources that apply to a media type"""
+    return [source for source in SOURCES if media_type in source.media_types]
+
+
+def get_title_key(details):
+    """Key a title by its IMDb ID, or by its TMDB ID when IMDb has none"""
+    if details.get("imdb_id"):
+        return details["imdb_id"]
+
+    if details.get("tmdb_id"):
+        return f"tmdb:{details['media_type']}:{details['tmdb_id']}"
+
+    return None
+
+
+def get_unavailable_sites(unavailable):
+    """Get the names of the sites behind a set of unavailable sources"""
+    return sorted({SOURCE_SITES[name] for name in unavailable})
+
+
+class Execution:
+    """
+    Run the sources for one title as a dependency graph.
+
+    Each source starts as soon as the sources it depends on have resolved,
+    and its start and end times are recorded so the critical path of the
+    request can be reported.
+
+    A source that fails or misses its deadline resolves to None and is marked
+    unavailable, as are the sources depending on it. Sources still running
+    when the page budget is spent are cancelled and marked unavailable too.
+
+    """
+
+    def __init__(self, media_type, inputs, budget=DETAILS_BUDGET):
+        self.sources = get_sources(media_type)
+        self.inputs = {**inputs, "title_key": get_title_key(inputs)}
+        self.budget = budget
+        self.tasks = {}
+        self.timings = {}
+        self.unavailable = set()
+
+    def start(self):
+        """Create a task for every source node"""
+        for source in self.sources:
+            self.tasks[source.name] = asyncio.create_task(self.run_source(source))
+
+        return self.tasks
+
+    async def run_source(self, source):
+        """Wait for the source's dependencies, then fetch it"""
+        args = []
+
+        for name in source.inputs:
+            if name in SOURCES_BY_NAME:
+                args.append(await self.tasks[name])
+
+                # Without its input this source cannot be fetched either
+                if name in self.unavailable:
+                    self.unavailable.add(source.name)
+                    return None
+            else:
+                args.append(self.inputs.get(name))
+
+        started = time.perf_counter()
+
+        try:
+            return await asyncio.wait_for(
+                source.func(*args), SOURCE_DEADLINES[source.name]
+            )
+
+        except asyncio.TimeoutError:
+            logging.error(f"Source {source.name} missed its deadline")
+            SOURCE_TIMEOUTS.inc(source=source.name)
+            self.unavailable.add(source.name)
+
+        except CacheMiss:
+            self.unavailable.add(source.name)
+
+        except Exception as exc:
+            logging.error(f"Source {source.name} failed: {exc!r}")
+            SOURCE_FAILURES.inc(source=source.name)
+            self.unavailable.add(source.name)
+
+        finally:
+            finished = time.perf_counter()
+            self.timings[source.name] = (started, finished)
+            SOURCE_SECONDS.observe(finished - started, source=source.name)
+            add_timing("source", finished - started, source.name)
+
+        return None
+
+    async def stream(self):
+        """
+        Run every source within the page budget, yielding results as they land.
+
+        Yields:
+        - tuple: (name, value) for each source in completion order. Sources
+          cancelled when the budget is spent are yielded last with None.
+
+        """
+        tasks = self.start()
+        names = {task: name for name, task in tasks.items()}
+        pending = set(tasks.values())
+        deadline = asyncio.get_running_loop().time() + self.budget
+
+        try:
+            while pending:
+                timeout = deadline - asyncio.get_running_loop().time()
+
+                if timeout <= 0:
+                    break
+
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for task in done:
+                    yield names[task], task.result()
+
+        finally:
+            # Cancel whatever is left once the budget is spent
+            for task in pending:
+                task.cancel()
+
+        if pending:
+            logging.error(f"Details budget spent, cancelled {len(pending)} sources")
+            await asyncio.wait(pending)
+
+        for task in pending:
+            self.unavailable.add(names[task])
+            yield names[task], None
+
+    async def run(self):
+        """Run every source within the page budget and return results by name"""
+        results = {source.name: None for source in SOURCES}
+
+        async for name, value in self.stream():
+            results[name] = value
+
+        return results
+
+    def critical_path(self):
+        """
+        Get the chain of sources that determined when the last one finished.
+
+        Returns:
+        - list: (name, duration in ms) pairs, from the first source to the last.
+
+        """
+        if not self.timings:
+            return []
+
+        name = max(self.timings, key=lambda name: self.timings[name][1])
+        path = []
+
+        while name:
+            started, ended = self.timings[name]
+            path.append((name, (ended - started) * 1000))
+
+            # Follow the dependency that finished last, as it gated this source
+            dependencies = [
+                dependency
+                for dependency in SOURCES_BY_NAME[name].inputs
+                if dependency in self.timings
+            ]
+            name = max(
+                dependencies, key=lambda name: self.timings[name][1], default=None
+            )
+
+        return path[::-1]
+
+
+def format_critical_path(path):
+    """Format a critical path for a response header"""
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in path)
+
+
+async def collect_ratings(tmdb_id, media_type):
+    """
+    Get the details and every source's rating for a title.
+
+    Returns:
+    - dict: The title's TMDB details, ratings by source name, and the names of
+      sources that were unavailable.
+
+    """
+    details = await get_title_details(tmdb_id, media_type, TMDB_API_KEY)
+    execution = Execution(media_type, details)
+    ratings = await execution.run()
+
+    return {
+        "details": details,
+        "ratings": ratings,
+        "unavailable": sorted(execution.unavailable),
+    }
+
+
+async def rate_title(tmdb_id, media_type):
+    """Collect ratings for a title, reporting failures in the result"""
+    result = {"tmdb_id": tmdb_id, "media_type": media_type}
+
+    try:
+        result.update(await collect_ratings(tmdb_id, media_type))
+        result["status"] = "ok"
+
+    except CacheMiss:
+        result["status"] = "miss"
+
+    except Exception as exc:
+        logging.error(f"Ratings for {tmdb_id} failed: {exc!r}")
+        result["status"] = "error"
+
+    return result
+
+
+async def rate_titles(titles, concurrency, only_cached=False):
+    """
+    Collect ratings for many titles with bounded concurrency.
+
+    Work runs at background priority so it queues behind interactive page
+    views for the upstream hosts.
+
+    Parameters:
+    - titles (iterable): (tmdb_id, media_type) pairs, consumed lazily.
+    - concurrency (int): How many titles to work on at once.
+    - only_cached (bool): Answer from the cache only, never going upstream.
+
+    Yields:
+    - dict: The result for each title, in completion order.
+
+    """
+    titles = iter(titles)
+    results = asyncio.Queue()
+
+    async def worker():
+        priority.set(BACKGROUND)
+        cache_only.set(only_cached)
+
+        try:
+            for tmdb_id, media_type in titles:
+                results.put_nowait(await rate_title(tmdb_id, media_type))
+
+        finally:
+            # Tell the consumer this worker is done
+            results.put_nowait(None)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    finished = 0
+
+    try:
+        while finished < len(workers):
+            result = await results.get()
+
+            if result is None:
+                finished += 1
+            else:
+                yield result
+
+    finally:
+        for task in workers:
+            task.cancel()
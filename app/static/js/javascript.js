@@ -22,4 +22,64 @@ document.querySelector('.clear-button').addEventListener('click', function () {
   document.querySelector('.search-field').value = '';
   toggleClearButton();
   searchInput.focus();
-});
\ No newline at end of file
+});
+
+// AUTOCOMPLETE
+
+const suggestionList = document.querySelector('.suggestions');
+let suggestTimer = null;
+
+// Function to show title suggestions as links to their details pages
+function showSuggestions(suggestions) {
+  suggestionList.replaceChildren(...suggestions.map(function (suggestion) {
+    const item = document.createElement('li');
+    const link = document.createElement('a');
+    const year = document.createElement('span');
+    link.href = `/details/${suggestion.tmdb_id}/${suggestion.media_type}/`;
+    link.textContent = `${suggestion.title} `;
+    year.className = 'suggestion-year';
+    year.textContent = suggestion.year ? `(${suggestion.year})` : '';
+    link.appendChild(year);
+    item.appendChild(link);
+    return item;
+  }));
+  suggestionList.style.display = suggestions.length ? 'block' : 'none';
+}
+
+// Fetch suggestions once typing pauses, ignoring answers to older queries
+function fetchSuggestions() {
+  const query = document.querySelector('.search-field').value.trim();
+
+  if (query.length < 2) {
+    showSuggestions([]);
+    return;
+  }
+
+  fetch(`/api/suggest?q=${encodeURIComponent(query)}`)
+    .then(function (response) { return response.ok ? response.json() : []; })
+    .then(function (suggestions) {
+      if (document.querySelector('.search-field').value.trim() === query) {
+        showSuggestions(suggestions);
+      }
+    })
+    .catch(function () { showSuggestions([]); });
+}
+
+// Listen for input on search field then fetch suggestions after a short pause
+document.querySelector('.search-field').addEventListener('input', function () {
+  clearTimeout(suggestTimer);
+  suggestTimer = setTimeout(fetchSuggestions, 150);
+});
+
+// Hide suggestions on Escape or when clicking outside the search form
+document.querySelector('.search-field').addEventListener('keydown', function (event) {
+  if (event.key === 'Escape') {
+    showSuggestions([]);
+  }
+});
+
+document.addEventListener('click', function (event) {
+  if (!event.target.closest('.search-wrapper')) {
+    showSuggestions([]);
+  }
+});
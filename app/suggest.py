@@ -0,0 +1,215 @@
+# suggest.py
+import asyncio
+import heapq
+import json
+import logging
+import re
+import sqlite3
+import threading
+
+from collections import OrderedDict, defaultdict
+from environs import Env
+from unidecode import unidecode
+from .cache import CACHE_PATH
+from .tmdb import search_title
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+# Suggestions returned per query, and the most titles kept in the index; past
+# that the least recently seen or suggested titles are dropped
+SUGGEST_LIMIT = env.int("SUGGEST_LIMIT", 8)
+SUGGEST_MAX_TITLES = env.int("SUGGEST_MAX_TITLES", 50000)
+
+# Shortest query that may fall back to a TMDB search when nothing local matches
+SUGGEST_MIN_FALLBACK = env.int("SUGGEST_MIN_FALLBACK", 3)
+
+# Longest word prefix indexed; longer query words are matched on this prefix
+MAX_PREFIX = 12
+
+
+def normalize(text):
+    """Lowercase, strip accents and punctuation so 'Amélie!' matches 'amelie'"""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", unidecode(text).lower()).split())
+
+
+def get_title_key(title):
+    return f"{title['media_type']}/{title['tmdb_id']}"
+
+
+def get_prefixes(name):
+    """Get the edge n-grams of every word in a normalized title"""
+    for word in name.split():
+        for length in range(1, min(len(word), MAX_PREFIX) + 1):
+            yield word[:length]
+
+
+class SuggestIndex:
+    """In-memory edge n-gram index of the titles the app has seen"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = None
+        self.titles = OrderedDict()
+        self.names = {}
+        self.prefixes = defaultdict(set)
+        self.evicted = []
+
+    def connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(
+                self.path, timeout=5, check_same_thread=False
+            )
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS suggest_titles "
+                "(title_key TEXT PRIMARY KEY, title TEXT NOT NULL)"
+            )
+            self.connection.commit()
+
+        return self.connection
+
+    def add(self, title):
+        """Index a title, returning True if it was new"""
+        key = get_title_key(title)
+
+        if key in self.titles:
+            self.titles.move_to_end(key)
+            return False
+
+        self.titles[key] = title
+        self.names[key] = normalize(title["title"])
+
+        for prefix in get_prefixes(self.names[key]):
+            self.prefixes[prefix].add(key)
+
+        # Make room by dropping the least recently seen or suggested title
+        while len(self.titles) > SUGGEST_MAX_TITLES:
+            self.remove(next(iter(self.titles)))
+
+        return True
+
+    def remove(self, key):
+        """Drop a title from the index, and later from disk"""
+        del self.titles[key]
+
+        for prefix in get_prefixes(self.names.pop(key)):
+            keys = self.prefixes[prefix]
+            keys.discard(key)
+
+            if not keys:
+                del self.prefixes[prefix]
+
+        self.evicted.append(key)
+
+    def search(self, query, limit=SUGGEST_LIMIT):
+        """Get the titles with a word starting with each word of the query"""
+        query = normalize(query)
+        words = query.split()
+
+        if not words:
+            return []
+
+        matches = set.intersection(
+            *(self.prefixes.get(word[:MAX_PREFIX], set()) for word in words)
+        )
+
+        # Titles starting with the query first, then shorter titles
+        keys = heapq.nsmallest(
+            limit,
+            matches,
+            key=lambda key: (
+                not self.names[key].startswith(query),
+                len(self.titles[key]["title"]),
+                key,
+            ),
+        )
+
+        for key in keys:
+            self.titles.move_to_end(key)
+
+        return [self.titles[key] for key in keys]
+
+    def load(self):
+        """Load the titles persisted by earlier runs and other workers"""
+        with self.lock:
+            rows = (
+                self.connect()
+                .execute("SELECT title FROM suggest_titles ORDER BY rowid")
+                .fetchall()
+            )
+
+        return [json.loads(row[0]) for row in rows]
+
+    def save(self, titles, evicted=()):
+        """Persist newly indexed titles and forget evicted ones"""
+        with self.lock:
+            connection = self.connect()
+            connection.executemany(
+                "INSERT OR IGNORE INTO suggest_titles (title_key, title) VALUES (?, ?)",
+                [(get_title_key(title), json.dumps(title)) for title in titles],
+            )
+            connection.executemany(
+                "DELETE FROM suggest_titles WHERE title_key = ?",
+                [(key,) for key in evicted],
+            )
+            connection.commit()
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+suggest_index = SuggestIndex(CACHE_PATH)
+
+
+async def load_index():
+    """Fill the index from the titles persisted on disk"""
+    for title in await asyncio.to_thread(suggest_index.load):
+        suggest_index.add(title)
+
+
+async def record_titles(titles):
+    """Index titles seen in search results, details pages or warmer lists"""
+    fields = ["tmdb_id", "title", "year", "media_type", "poster_img"]
+    new_titles = [
+        {field: title.get(field) for field in fields}
+        for title in titles
+        if title and title.get("title") and title.get("tmdb_id")
+    ]
+    new_titles = [title for title in new_titles if suggest_index.add(title)]
+    evicted, suggest_index.evicted = suggest_index.evicted, []
+
+    if new_titles or evicted:
+        try:
+            await asyncio.to_thread(suggest_index.save, new_titles, evicted)
+
+        except sqlite3.Error as exc:
+            logging.error(f"Could not persist suggestions: {exc}")
+
+
+async def suggest_titles(query):
+    """
+    Suggest titles for a partial query.
+
+    Answers from the local index, and only searches TMDB for queries that
+    match nothing seen before.
+
+    """
+    suggestions = suggest_index.search(query)
+
+    if not suggestions and len(normalize(query)) >= SUGGEST_MIN_FALLBACK:
+        search_results = await search_title(query)
+        await record_titles(search_results)
+        suggestions = suggest_index.search(query) or search_results[:SUGGEST_LIMIT]
+
+    return suggestions
+
+
+def close_suggest_index():
+    """Close the on-disk store"""
+    suggest_index.close()
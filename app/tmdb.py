@@ -1,7 +1,15 @@
 # search.py
-import requests
+import asyncio
+import logging
+
+import httpx
 
 from environs import Env
+from .assets import asset_url
+from .cache import cached
+from .client import get_client
+from .metrics import TMDB_SECONDS, timer
+from .posters import poster_url
 from .utils import format_runtime
 
 # Loads environment variables
@@ -11,35 +19,108 @@ env.read_env()
 # Gets the TMDB API key from the environment variables
 TMDB_API_KEY = env.str("TMDB_API_KEY")
 
+# TMDB API root, overridable to point at a local stand-in
+TMDB_API_URL = env.str("TMDB_API_URL", "https://api.themoviedb.org/3")
+
+# Timeout and retry settings for TMDB API calls
+TMDB_TIMEOUT = env.float("TMDB_TIMEOUT", 10.0)
+TMDB_MAX_RETRIES = env.int("TMDB_MAX_RETRIES", 2)
+TMDB_RETRY_BACKOFF = env.float("TMDB_RETRY_BACKOFF", 0.5)
+
+# Longest Retry-After in seconds worth waiting for, anything longer fails fast
+TMDB_MAX_RETRY_AFTER = env.float("TMDB_MAX_RETRY_AFTER", 2.0)
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+async def fetch_json(url):
+    """
+    Make an asynchronous HTTP GET request to the TMDB API and return JSON data.
+
+    Transport errors and retryable status codes are retried with exponential
+    backoff, honouring TMDB's Retry-After header when rate limited unless it
+    asks for a wait longer than TMDB_MAX_RETRY_AFTER.
+
+    Parameters:
+    - url (str): The URL to request.
+
+    Returns:
+    - dict: The decoded JSON response.
+
+    Raises:
+    - httpx.HTTPError: If the request still fails after all retries.
+
+    """
+    client = get_client()
+    endpoint = url[len(TMDB_API_URL) :].split("/")[1].split("?")[0]
+
+    for attempt in range(TMDB_MAX_RETRIES + 1):
+        delay = TMDB_RETRY_BACKOFF * (2**attempt)
+
+        try:
+            with timer(TMDB_SECONDS, "tmdb", endpoint, endpoint=endpoint):
+                response = await client.get(url, timeout=TMDB_TIMEOUT)
+
+            if (
+                response.status_code in RETRY_STATUS_CODES
+                and attempt < TMDB_MAX_RETRIES
+            ):
+                retry_after = response.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else delay
+
+                # A longer wait would outlast the page's deadline
+                if delay <= TMDB_MAX_RETRY_AFTER:
+                    logging.warning(f"TMDB returned {response.status_code}, retrying")
+                    await asyncio.sleep(delay)
+                    continue
+
+                logging.warning(f"TMDB asked to retry after {delay}s, giving up")
+
+            # Check that the request was successful (status code 2xx)
+            response.raise_for_status()
+
+            return response.json()
+
+        except httpx.TransportError as exc:
+            if attempt == TMDB_MAX_RETRIES:
+                raise
+
+            logging.warning(f"TMDB Request Error: {exc}, retrying")
+            await asyncio.sleep(delay)
+
 
 # --------- SEARCH FOR MOVIE OR TV SERIES -------------- #
 
 
-def search_title(user_input):
+async def search_title(user_input):
     """Look up movie, TV shows, and people using the TMDB API"""
-    title = user_input.replace(" ", "%20")
-    url = f"https://api.themoviedb.org/3/search/multi?api_key={TMDB_API_KEY}&query={title}&include_adult=false&language=en-US&page=1"
-    search_results = get_search_results(url)
-    filtered_results = filter_search_results(search_results)
+    return await search_normalized(normalize_query(user_input))
 
-    return filtered_results
 
+def normalize_query(user_input):
+    """Fold case and whitespace so equivalent queries share one cache entry"""
+    return " ".join(user_input.lower().split())
 
-def get_search_results(url):
-    """Make an HTTP GET request to TMDB API and return JSON data"""
 
-    # Make the HTTP GET request
-    response = requests.get(url)
+@cached("tmdb_search")
+async def search_normalized(query):
+    """Search TMDB for an already normalized query"""
+    title = query.replace(" ", "%20")
+    url = f"{TMDB_API_URL}/search/multi?api_key={TMDB_API_KEY}&query={title}&include_adult=false&language=en-US&page=1"
+    search_results = await get_search_results(url)
+    filtered_results = filter_search_results(search_results)
+
+    return filtered_results
 
-    # Check that the request was successful (status code 2xx)
-    response.raise_for_status()
 
-    return response.json()
+async def get_search_results(url):
+    """Make an HTTP GET request to TMDB API and return JSON data"""
+    return await fetch_json(url)
 
 
 def filter_search_results(search_results):
     """Filter the search results based on media type"""
-    poster_base_url = "https://www.themoviedb.org/t/p/w185"
     seen_tmdb_ids = set()
     filtered_results = []
 
@@ -47,7 +128,7 @@ def filter_search_results(search_results):
         tmdb_id = result.get("id")
         poster_path = result.get("poster_path")
         media_type = result.get("media_type")
-        poster_img = get_poster_image(poster_base_url, poster_path)
+        poster_img = get_poster_image("w185", poster_path)
 
         # Check if TMDB id is already seen to avoid duplicates
         if tmdb_id not in seen_tmdb_ids:
@@ -62,12 +143,12 @@ def filter_search_results(search_results):
     return filtered_results
 
 
-def get_poster_image(poster_base_url, poster_path):
+def get_poster_image(size, poster_path):
     # Use image placeholder if no poster file path exists
     if poster_path is None:
-        return "/static/img/poster-holder.jpg"
+        return asset_url("img/poster-holder.jpg")
     else:
-        return f"{poster_base_url}{poster_path}"
+        return poster_url(size, poster_path)
 
 
 def get_filtered_results(result, media_type, tmdb_id, poster_img):
@@ -91,26 +172,43 @@ def get_filtered_results(result, media_type, tmdb_id, poster_img):
         }
 
 
+# --------- TRENDING AND POPULAR TITLES -------------- #
+
+
+async def get_trending_titles():
+    """Get today's trending movies and TV shows using the TMDB API"""
+    url = f"{TMDB_API_URL}/trending/all/day?api_key={TMDB_API_KEY}&language=en-US"
+    search_results = await fetch_json(url)
+
+    return filter_search_results(search_results)
+
+
+async def get_popular_titles(media_type):
+    """Get the currently popular movies ('movie') or TV shows ('tv')"""
+    url = f"{TMDB_API_URL}/{media_type}/popular?api_key={TMDB_API_KEY}&language=en-US&page=1"
+    search_results = await fetch_json(url)
+
+    # Popular lists are a single media type, so results do not carry it
+    for result in search_results["results"]:
+        result.setdefault("media_type", media_type)
+
+    return filter_search_results(search_results)
+
+
 # --------- SEARCH TITLE DETAILS -------------- #
 
 
-def get_media_details(tmdb_id, media_type, TMDB_API_KEY):
+async def get_media_details(tmdb_id, media_type, TMDB_API_KEY):
     """Fetch the details of the selected title details using the TMDB API"""
-    url = f"https://api.themoviedb.org/3/{media_type.lower()}/{tmdb_id}?api_key={TMDB_API_KEY}&language=en-US&append_to_response=release_dates,watch/providers,external_ids,credits"
-    response = requests.get(url)
-    response.raise_for_status()
+    url = f"{TMDB_API_URL}/{media_type.lower()}/{tmdb_id}?api_key={TMDB_API_KEY}&language=en-US&append_to_response=release_dates,watch/providers,external_ids,credits"
 
-    return response.json()
+    return await fetch_json(url)
 
 
 def get_common_details(media_details):
     """Extract common details for both Movie and TV series"""
     poster_path = media_details.get("poster_path")
-    poster_img = (
-        f"https://image.tmdb.org/t/p/w500{poster_path}"
-        if poster_path
-        else "/static/img/poster-holder.jpg"
-    )
+    poster_img = get_poster_image("w500", poster_path)
     justwatch_url = get_justwatch_url(media_details)
 
     return poster_img, justwatch_url
@@ -184,9 +282,10 @@ def get_justwatch_url(media_details):
     return justwatch_url
 
 
-def get_title_details(tmdb_id, media_type, TMDB_API_KEY):
+@cached("tmdb", key=lambda tmdb_id, media_type, *_: (tmdb_id, media_type))
+async def get_title_details(tmdb_id, media_type, TMDB_API_KEY):
     """Get the details for the selected title and media type"""
-    media_details = get_media_details(tmdb_id, media_type, TMDB_API_KEY)
+    media_details = await get_media_details(tmdb_id, media_type, TMDB_API_KEY)
     poster_img, justwatch_url = get_common_details(media_details)
 
     if media_type == "Movie":
@@ -195,6 +294,7 @@ def get_title_details(tmdb_id, media_type, TMDB_API_KEY):
         )
         filtered_details = {
             "director": director,
+            "tmdb_id": tmdb_id,
             "imdb_id": imdb_id,
             "media_type": media_type,
             "title": title,
@@ -209,6 +309,7 @@ def get_title_details(tmdb_id, media_type, TMDB_API_KEY):
         imdb_id, title, year, creator = get_tv_details(media_details)
         filtered_details = {
             "creator": creator,
+            "tmdb_id": tmdb_id,
             "imdb_id": imdb_id,
             "media_type": media_type,
             "title": title,
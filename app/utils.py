@@ -9,3 +9,14 @@ def format_runtime(runtime):
     minutes = runtime - (hours * 60)
 
     return f"{hours}h {minutes}m"
+
+
+def format_age(seconds):
+    """Format an age in seconds as a short human readable duration"""
+    if seconds < 60 * 60:
+        return f"{math.floor(seconds / 60)}m"
+
+    if seconds < 24 * 60 * 60:
+        return f"{math.floor(seconds / (60 * 60))}h"
+
+    return f"{math.floor(seconds / (24 * 60 * 60))}d"
@@ -0,0 +1,246 @@
+# warmer.py
+"""
+Pre-scrape ratings for trending and popular titles so first views hit the cache.
+
+Runs in-process every WARMER_INTERVAL seconds when that is set, or on its own:
+    python -m app.warmer [--loop]
+
+Only one process per host warms at a time, whichever holds WARMER_LOCK_PATH,
+so gunicorn workers do not each scrape the same titles.
+"""
+import argparse
+import asyncio
+import fcntl
+import logging
+import time
+
+from collections import Counter
+from environs import Env
+from .cache import (
+    CACHE_PATH,
+    CACHE_TTLS,
+    HOUR,
+    CacheMiss,
+    Entry,
+    cache_only,
+    close_cache,
+    disk_cache,
+    make_key,
+    prune_entries,
+    source_ages,
+)
+from .client import close_client
+from .id_index import close_index
+from .parsing import close_executor
+from .sources import collect_ratings, rate_titles
+from .suggest import close_suggest_index, record_titles
+from .tmdb import get_popular_titles, get_trending_titles
+
+# Loads environment variables
+env = Env()
+env.read_env()
+
+# Seconds between in-process warm cycles, 0 leaves the warmer off
+WARMER_INTERVAL = env.int("WARMER_INTERVAL", 0)
+
+# Most titles scraped per cycle, and how many at once
+WARMER_BUDGET = env.int("WARMER_BUDGET", 50)
+WARMER_CONCURRENCY = env.int("WARMER_CONCURRENCY", 2)
+
+# Seconds before a title whose sources stayed unavailable is warmed again, so
+# failing or empty sources are not re-scraped every cycle
+WARMER_RETRY_AFTER = env.int("WARMER_RETRY_AFTER", 6 * HOUR)
+
+# Lock file held by the one process on the host that runs the warmer
+WARMER_LOCK_PATH = env.str("WARMER_LOCK_PATH", f"{CACHE_PATH}.warmer.lock")
+
+_task = None
+_lock = None
+
+
+async def get_candidates():
+    """Get trending and popular titles, most trending first, without repeats"""
+    lists = await asyncio.gather(
+        get_trending_titles(),
+        get_popular_titles("movie"),
+        get_popular_titles("tv"),
+        return_exceptions=True,
+    )
+    candidates = []
+
+    for titles in lists:
+        if isinstance(titles, Exception):
+            logging.error(f"Warmer could not fetch a title list: {titles!r}")
+            continue
+
+        await record_titles(titles)
+
+        for title in titles:
+            pair = (str(title["tmdb_id"]), title["media_type"])
+
+            if pair not in candidates:
+                candidates.append(pair)
+
+    return candidates
+
+
+async def record_attempt(tmdb_id, media_type, status):
+    """Remember when the warmer last rated a title"""
+    key = make_key("warmer_attempt", tmdb_id, media_type)
+    await asyncio.to_thread(disk_cache.set, key, Entry(status, time.time()))
+
+
+async def recently_attempted(tmdb_id, media_type):
+    """Check whether the warmer rated a title within WARMER_RETRY_AFTER"""
+    key = make_key("warmer_attempt", tmdb_id, media_type)
+    entry = await asyncio.to_thread(disk_cache.get, key)
+
+    return entry is not None and time.time() - entry.stored_at < WARMER_RETRY_AFTER
+
+
+async def is_warm(tmdb_id, media_type):
+    """
+    Check from the cache alone whether every value for a title is fresh.
+
+    Sources missing from the cache, which failed or have nothing to cache,
+    count as warm once the warmer has tried them within WARMER_RETRY_AFTER.
+
+    """
+    ages = {}
+    ages_token = source_ages.set(ages)
+    cache_only_token = cache_only.set(True)
+
+    try:
+        result = await collect_ratings(tmdb_id, media_type)
+
+    except CacheMiss:
+        return await recently_attempted(tmdb_id, media_type)
+
+    finally:
+        source_ages.reset(ages_token)
+        cache_only.reset(cache_only_token)
+
+    if result["unavailable"] and not await recently_attempted(tmdb_id, media_type):
+        return False
+
+    return all(age < CACHE_TTLS[source] for source, age in ages.items())
+
+
+async def warm():
+    """Run one warm cycle over the current trending and popular titles"""
+    cold = []
+
+    for tmdb_id, media_type in await get_candidates():
+        if len(cold) >= WARMER_BUDGET:
+            break
+
+        if not await is_warm(tmdb_id, media_type):
+            cold.append((tmdb_id, media_type))
+
+    statuses = Counter()
+
+    async for result in rate_titles(cold, WARMER_CONCURRENCY):
+        statuses[result["status"]] += 1
+        await record_attempt(result["tmdb_id"], result["media_type"], result["status"])
+
+    await prune_entries("warmer_attempt", WARMER_RETRY_AFTER)
+
+    logging.info(f"Warmed {len(cold)} titles: {dict(statuses)}")
+
+
+async def run_warmer(interval):
+    """Warm the cache every interval seconds until cancelled"""
+    while True:
+        try:
+            await warm()
+
+        except Exception as exc:
+            logging.error(f"Warm cycle failed: {exc!r}")
+
+        await asyncio.sleep(interval)
+
+
+def acquire_lock():
+    """Take the host-wide warmer lock, returning False if another process has it"""
+    global _lock
+
+    if _lock is None:
+        lock = open(WARMER_LOCK_PATH, "a")
+
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        except OSError:
+            lock.close()
+            return False
+
+        _lock = lock
+
+    return True
+
+
+def release_lock():
+    global _lock
+
+    if _lock is not None:
+        _lock.close()
+        _lock = None
+
+
+def start_warmer():
+    """Start the in-process warmer if WARMER_INTERVAL is set, in one worker"""
+    global _task
+
+    if WARMER_INTERVAL > 0 and _task is None:
+        if not acquire_lock():
+            logging.info("Another process is running the warmer")
+            return
+
+        _task = asyncio.create_task(run_warmer(WARMER_INTERVAL))
+
+
+async def stop_warmer():
+    """Stop the in-process warmer"""
+    global _task
+
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+    release_lock()
+
+
+async def main(args):
+    if not acquire_lock():
+        logging.error("Another process is running the warmer")
+        return
+
+    try:
+        if args.loop:
+            await run_warmer(args.interval)
+        else:
+            await warm()
+
+    finally:
+        await close_client()
+        close_cache()
+        close_index()
+        close_suggest_index()
+        close_executor()
+        release_lock()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--loop", action="store_true", help="Keep warming")
+    parser.add_argument(
+        "--interval", type=int, default=WARMER_INTERVAL or 900, help="Seconds"
+    )
+
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,234 @@
+# extractors.py
+"""
+Benchmark the parse-plus-extract cost of every scraped source offline.
+
+Usage:
+    python -m benchmarks.extractors [--fixtures DIR] [--compare OLD.json]
+
+Times the work each get_* function in app/scraper.py does once its page has
+been downloaded, for every installed parser backend, with and without the
+source's strainer, and records peak memory. Results are saved as JSON, and
+compared against an earlier run to flag regressions.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from app.parsing import parse_html
+from app.scraper import (
+    STRAINERS,
+    extract_box_office_amounts,
+    extract_commonsense_info,
+    extract_imdb_rating,
+    extract_justwatch_page,
+    extract_letterboxd_rating,
+    extract_letterboxd_url,
+    extract_rottentomatoes_scores,
+    extract_rottentomatoes_url,
+)
+from .pages import build_pages
+
+# Each source's extractor, its extra arguments and its result on the fixture
+CASES = {
+    "rottentomatoes_url": (
+        extract_rottentomatoes_url,
+        ("1995", "Movie"),
+        "https://www.rottentomatoes.com/m/heat_1995",
+    ),
+    "rottentomatoes_scores": (
+        extract_rottentomatoes_scores,
+        (),
+        {
+            "tomatometer": "87",
+            "tomatometer_state": "certified-fresh",
+            "audience_score": "94",
+            "audience_state": "upright",
+        },
+    ),
+    "letterboxd_url": (
+        extract_letterboxd_url,
+        ("1995",),
+        "https://letterboxd.com/film/heat-1995/",
+    ),
+    "letterboxd_rating": (extract_letterboxd_rating, (), 4.1),
+    "commonsense_info": (
+        extract_commonsense_info,
+        ("1995", "Movie"),
+        {
+            "url": "https://www.commonsensemedia.org/movie-reviews/heat-1995",
+            "rating": "age 16+",
+        },
+    ),
+    "imdb_rating": (extract_imdb_rating, (), "8.3"),
+    "box_office_amounts": (
+        extract_box_office_amounts,
+        (),
+        ["$67,436,818", "$119,999,999", "$187,436,818"],
+    ),
+    "justwatch_page": (
+        extract_justwatch_page,
+        (),
+        "https://www.justwatch.com/us/movie/heat",
+    ),
+}
+
+PARSERS = [
+    parser
+    for parser, module in [
+        ("lxml", "lxml"),
+        ("html.parser", "html.parser"),
+        ("html5lib", "html5lib"),
+    ]
+    if importlib.util.find_spec(module)
+]
+
+# Slowdown against the compared run that counts as a regression
+REGRESSION_THRESHOLD = 1.2
+
+
+def load_pages(fixtures):
+    """
+    Load recorded <source>.html pages, falling back to synthetic ones.
+
+    Returns:
+    - dict: Page content by source.
+    - set: The sources whose page was recorded rather than synthetic.
+
+    """
+    pages = build_pages()
+    recorded = set()
+
+    if fixtures:
+        for source in CASES:
+            path = os.path.join(fixtures, f"{source}.html")
+
+            if os.path.exists(path):
+                with open(path, "rb") as file:
+                    pages[source] = file.read()
+                    recorded.add(source)
+
+    return pages, recorded
+
+
+def run_case(content, parse_only, parser, extractor, args, repeat):
+    """Time parse-plus-extract and measure its peak traced memory"""
+    durations = []
+
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = extractor(parse_html(content, parse_only, parser), *args)
+        durations.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    extractor(parse_html(content, parse_only, parser), *args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, {
+        "median_ms": round(statistics.median(durations) * 1000, 3),
+        "min_ms": round(min(durations) * 1000, 3),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def benchmark(pages, recorded, repeat):
+    """Run every source under every parser, strained and unstrained"""
+    results = {}
+
+    for source, (extractor, args, expected) in CASES.items():
+        for parser in PARSERS:
+            for strained in (True, False):
+                parse_only = STRAINERS[source] if strained else None
+                result, timing = run_case(
+                    pages[source], parse_only, parser, extractor, args, repeat
+                )
+                name = f"{source}/{parser}/{'strained' if strained else 'full'}"
+
+                # Recorded pages are for another title, so only expect a value
+                correct = (
+                    result is not None if source in recorded else result == expected
+                )
+                results[name] = {
+                    **timing,
+                    "bytes": len(pages[source]),
+                    "correct": correct,
+                }
+                print(
+                    f"{name:50} {timing['median_ms']:9.2f} ms "
+                    f"{timing['peak_kib']:9.1f} KiB"
+                    f"{'' if correct else '  WRONG RESULT'}"
+                )
+
+    return results
+
+
+def compare(results, path):
+    """Print cases that got slower than the earlier run, returning the count"""
+    with open(path) as file:
+        previous = json.load(file)["results"]
+
+    regressions = 0
+
+    for name, timing in results.items():
+        if name not in previous:
+            continue
+
+        ratio = timing["median_ms"] / max(previous[name]["median_ms"], 0.001)
+
+        if ratio > REGRESSION_THRESHOLD:
+            regressions += 1
+            print(f"REGRESSION {name}: {ratio:.2f}x slower")
+
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--fixtures", help="Directory of recorded <source>.html")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per case")
+    parser.add_argument(
+        "--output", "-o", help="Defaults to benchmarks/results/<timestamp>.json"
+    )
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+
+    return parser.parse_args(argv)
+
+
+def main(args):
+    pages, recorded = load_pages(args.fixtures)
+    results = benchmark(pages, recorded, args.repeat)
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+
+    with open(output, "w") as file:
+        json.dump(
+            {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "recorded": sorted(recorded),
+                "repeat": args.repeat,
+                "results": results,
+            },
+            file,
+            indent=2,
+        )
+
+    print(f"Saved results to {output}")
+
+    wrong = [name for name, result in results.items() if not result["correct"]]
+    regressions = compare(results, args.compare) if args.compare else 0
+
+    return 1 if wrong or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,273 @@
+# loadtest.py
+"""
+Load test the app end to end against local stand-ins for every upstream.
+
+Usage:
+    python -m benchmarks.loadtest --workers 1,2,4 --concurrency 32 --duration 30
+
+Starts the stand-ins from benchmarks/upstreams.py, then for each worker count
+starts the app under uvicorn with an empty cache, pointed at the stand-ins,
+and drives it at the target concurrency. Reports throughput and p50/p95/p99
+latency per endpoint and saves them as JSON.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from collections import defaultdict
+
+import httpx
+
+from .upstreams import add_arguments
+
+
+def get_request(endpoint, rng, args):
+    """Build the method, path and form data for one request to an endpoint"""
+    if endpoint == "details":
+        tmdb_id = rng.randint(949, 949 + args.titles - 1)
+        return "GET", f"/details/{tmdb_id}/Movie/", None
+
+    if endpoint == "search":
+        return "POST", "/search", {"title": rng.choice(["heat", "Heat", "heat 95"])}
+
+    if endpoint == "suggest":
+        return "GET", f"/api/suggest?q={rng.choice(['he', 'hea', 'heat'])}", None
+
+    return "GET", "/", None
+
+
+def parse_mix(mix):
+    """Parse an endpoint mix like "details=8,search=1" into weights"""
+    weights = {}
+
+    for part in mix.split(","):
+        endpoint, _, weight = part.partition("=")
+        weights[endpoint.strip()] = float(weight or 1)
+
+    return weights
+
+
+def percentile(ordered, percent):
+    index = min(len(ordered) - 1, math.ceil(percent / 100 * len(ordered)) - 1)
+
+    return ordered[max(index, 0)]
+
+
+def summarize(samples, seconds):
+    """Get throughput, error count and latency percentiles per endpoint"""
+    summary = {}
+
+    for endpoint, results in sorted(samples.items()):
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, ok in results if not ok)
+        summary[endpoint] = {
+            "requests": len(results),
+            "errors": errors,
+            "rps": round(len(results) / seconds, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        }
+
+    return summary
+
+
+async def drive(base_url, args):
+    """Send requests at the target concurrency and time each one"""
+    weights = parse_mix(args.mix)
+    endpoints, endpoint_weights = list(weights), list(weights.values())
+    samples = defaultdict(list)
+    started = time.perf_counter()
+    measure_from = started + args.warmup
+    deadline = measure_from + args.duration
+
+    async def user(index, client):
+        rng = random.Random(index)
+
+        while time.perf_counter() < deadline:
+            endpoint = rng.choices(endpoints, endpoint_weights)[0]
+            method, path, data = get_request(endpoint, rng, args)
+            sent = time.perf_counter()
+
+            try:
+                response = await client.request(method, path, data=data)
+                ok = response.status_code < 400
+
+            except httpx.HTTPError:
+                ok = False
+
+            if sent >= measure_from:
+                samples[endpoint].append((time.perf_counter() - sent, ok))
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=args.timeout
+    ) as client:
+        await asyncio.gather(*(user(i, client) for i in range(args.concurrency)))
+
+    return summarize(samples, args.duration)
+
+
+async def wait_until_ready(base_url, process, timeout=30):
+    """Wait for the app to answer, failing if it exits first"""
+    deadline = time.monotonic() + timeout
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError("The app exited during startup")
+
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+
+            await asyncio.sleep(0.25)
+
+    raise RuntimeError("The app did not start in time")
+
+
+def start_upstreams(args):
+    """Start the stand-ins, returning the process and the app's settings"""
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.upstreams",
+        f"--port={args.port}",
+        f"--latency={args.latency}",
+        f"--jitter={args.jitter}",
+        f"--error-rate={args.error_rate}",
+        f"--tail-rate={args.tail_rate}",
+        f"--tail-latency={args.tail_latency}",
+    ]
+
+    if args.fixtures:
+        command.append(f"--fixtures={args.fixtures}")
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+
+    return process, json.loads(process.stdout.readline())
+
+
+def start_app(workers, upstream_env, cache_dir, args):
+    """Start the app under uvicorn with an empty cache"""
+    env = {
+        "TMDB_API_KEY": "loadtest",
+        "SESSION_SECRET_KEY": "loadtest",
+        **os.environ,
+        **upstream_env,
+        "CACHE_PATH": os.path.join(cache_dir, f"cache-{workers}.sqlite3"),
+        "HOST_RATE": str(args.host_rate),
+    }
+    command = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "app.main:app",
+        f"--workers={workers}",
+        f"--port={args.app_port}",
+        "--log-level=warning",
+        "--no-access-log",
+    ]
+
+    return subprocess.Popen(command, env=env)
+
+
+def print_summary(workers, summary):
+    print(f"\n{workers} worker(s)")
+    print(
+        f"{'endpoint':10} {'requests':>9} {'errors':>7} {'rps':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+
+    for endpoint, stats in summary.items():
+        print(
+            f"{endpoint:10} {stats['requests']:9} {stats['errors']:7} "
+            f"{stats['rps']:8} {stats['p50_ms']:8} {stats['p95_ms']:8} "
+            f"{stats['p99_ms']:8}"
+        )
+
+
+async def main(args):
+    upstreams, upstream_env = start_upstreams(args)
+    base_url = f"http://127.0.0.1:{args.app_port}"
+    runs = {}
+
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for workers in args.workers:
+                app = start_app(workers, upstream_env, cache_dir, args)
+
+                try:
+                    await wait_until_ready(base_url, app)
+                    runs[workers] = await drive(base_url, args)
+                    print_summary(workers, runs[workers])
+
+                finally:
+                    app.terminate()
+                    app.wait()
+
+    finally:
+        upstreams.terminate()
+        upstreams.wait()
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__),
+        "results",
+        f"loadtest-{time.strftime('%Y%m%d-%H%M%S')}.json",
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+
+    with open(output, "w") as file:
+        settings = {name: value for name, value in vars(args).items()}
+        json.dump({"settings": settings, "runs": runs}, file, indent=2)
+
+    print(f"\nSaved results to {output}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--workers",
+        type=lambda value: [int(count) for count in value.split(",")],
+        default=[1],
+        help="Comma separated app worker counts, e.g. 1,2,4",
+    )
+    parser.add_argument("--concurrency", "-c", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds")
+    parser.add_argument(
+        "--warmup", type=float, default=5.0, help="Seconds left out of the results"
+    )
+    parser.add_argument(
+        "--mix",
+        default="details=8,search=1,suggest=1",
+        help="Endpoint weights from details, search, suggest and home",
+    )
+    parser.add_argument(
+        "--titles", type=int, default=1000, help="Distinct titles requested"
+    )
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--app-port", type=int, default=8099)
+    parser.add_argument(
+        "--host-rate",
+        type=float,
+        default=1000.0,
+        help="Per-host request rate the app allows the stand-ins",
+    )
+    parser.add_argument("--output", "-o", help="Results JSON path")
+    add_arguments(parser)
+
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
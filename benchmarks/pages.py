@@ -0,0 +1,142 @@
+# pages.py
+"""
+Synthetic fixture pages for the extractor benchmarks.
+
+These are not recordings of the real sites. Each page carries the markup its
+extractor reads, buried in enough navigation, cards, inline scripts and JSON
+to approach the size and element count of the live page, so parser and
+strainer changes show up in the numbers. Record real pages with
+benchmarks/record.py and pass --fixtures to benchmark against those instead.
+"""
+import json
+import random
+
+# Approximate size in bytes of each live page, used to pad the synthetic ones
+PAGE_SIZES = {
+    "rottentomatoes_url": 350_000,
+    "rottentomatoes_scores": 600_000,
+    "letterboxd_url": 120_000,
+    "letterboxd_rating": 250_000,
+    "commonsense_info": 300_000,
+    "imdb_rating": 900_000,
+    "box_office_amounts": 150_000,
+    "justwatch_page": 200_000,
+}
+
+
+def filler(size, seed):
+    """Build roughly size bytes of generic page markup, as a list of blocks"""
+    rng = random.Random(seed)
+    words = "the film director cast review trailer stream watch season episode".split()
+    parts = []
+    length = 0
+
+    while length < size:
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(5, 40)))
+        block = rng.choice(
+            [
+                f'<div class="card card-{rng.randint(1, 99)}">'
+                f'<a href="/item/{rng.randint(1, 10**6)}" class="link">{text}</a>'
+                f'<span class="meta">{rng.randint(1950, 2024)}</span></div>',
+                f'<ul class="nav"><li><a href="/nav/{rng.randint(1, 999)}">'
+                f'{text[:20]}</a></li><li><a href="/nav/{rng.randint(1, 999)}">'
+                f"{text[-20:]}</a></li></ul>",
+                f'<section data-qa="section-{rng.randint(1, 99)}"><h2>{text[:30]}</h2>'
+                f'<p>{text}</p><img src="/img/{rng.randint(1, 10**6)}.jpg" '
+                f'alt="{text[:15]}"></section>',
+                f'<script type="application/json">'
+                f"{json.dumps({'items': [rng.randint(1, 10**6) for _ in range(20)]})}"
+                f"</script>",
+                f'<svg viewBox="0 0 24 24"><path d="M{rng.randint(1, 99)} '
+                f'{rng.randint(1, 99)}L{rng.randint(1, 99)} {rng.randint(1, 99)}Z">'
+                f"</path></svg>",
+            ]
+        )
+        parts.append(block)
+        length += len(block)
+
+    return parts
+
+
+def page(source, body):
+    """Wrap the markup an extractor reads in a page of the source's size"""
+    blocks = filler(PAGE_SIZES[source], source)
+    half = len(blocks) // 2
+
+    # Put the target mid-page, as it sits on the live site
+    html = (
+        f"<!DOCTYPE html><html><head><title>{source}</title>"
+        f'<meta charset="utf-8"><link rel="stylesheet" href="/main.css"></head>'
+        f"<body>{''.join(blocks[:half])}{body}{''.join(blocks[half:])}</body></html>"
+    )
+
+    return html.encode()
+
+
+def build_pages():
+    """Return each source's fixture page, keyed by source name"""
+    scorecard = {
+        "criticsScore": {"score": "87", "certified": True, "sentiment": "POSITIVE"},
+        "audienceScore": {"score": "94", "sentiment": "POSITIVE"},
+    }
+    rt_rows = "".join(
+        f'<search-page-media-row releaseyear="{year}" tomatometerscore="{score}">'
+        f'<a data-qa="thumbnail-link" '
+        f'href="https://www.rottentomatoes.com/m/heat_{year}"><img></a>'
+        f"</search-page-media-row>"
+        for year, score in [(1986, 40), (2013, 12), (1995, 87), (1972, 60)]
+    )
+    letterboxd_results = "".join(
+        f'<li><span class="film-title-wrapper"><a href="/film/heat-{year}/">Heat</a>'
+        f'<small class="metadata"><a href="/films/year/{year}/">{year}</a></small>'
+        f"</span></li>"
+        for year in [1986, 2013, 1995, 1972]
+    )
+    commonsense_results = "".join(
+        f'<div class="site-search-teaser">'
+        f'<div class="review-product-type caption">{kind}</div>'
+        f'<div class="review-product-summary">Heat ({year})</div>'
+        f'<span class="rating__age">age {age}+</span>'
+        f'<a href="/{kind.lower()}-reviews/heat-{year}">Heat</a></div>'
+        for kind, year, age in [
+            ("BOOK", 1995, 12),
+            ("TV", 1995, 14),
+            ("MOVIE", 1995, 16),
+        ]
+    )
+    box_office = "".join(
+        f'<div class="mojo-performance-summary-table">'
+        f'<span class="a-size-small">{label}</span><span class="money">'
+        f'<span class="a-size-medium a-text-bold">{amount}</span></span></div>'
+        for label, amount in [
+            ("Domestic", "$67,436,818"),
+            ("International", "$119,999,999"),
+            ("Worldwide", "$187,436,818"),
+        ]
+    )
+
+    return {
+        "rottentomatoes_url": page("rottentomatoes_url", rt_rows),
+        "rottentomatoes_scores": page(
+            "rottentomatoes_scores",
+            f'<script id="media-scorecard-json" type="application/json">'
+            f"{json.dumps(scorecard)}</script>",
+        ),
+        "letterboxd_url": page("letterboxd_url", f"<ul>{letterboxd_results}</ul>"),
+        "letterboxd_rating": page(
+            "letterboxd_rating",
+            '<meta name="twitter:data2" content="4.12 out of 5">',
+        ),
+        "commonsense_info": page("commonsense_info", commonsense_results),
+        "imdb_rating": page(
+            "imdb_rating",
+            '<div data-testid="hero-rating-bar__aggregate-rating__score">'
+            '<span class="sc-rating">8.3</span><span>/10</span></div>',
+        ),
+        "box_office_amounts": page("box_office_amounts", box_office),
+        "justwatch_page": page(
+            "justwatch_page",
+            '<div class="homepage"><a href="https://www.justwatch.com/us/movie/heat">'
+            "Watch now</a></div>",
+        ),
+    }
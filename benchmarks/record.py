@@ -0,0 +1,115 @@
+# record.py
+"""
+Record live pages of every scraped source as benchmark fixtures.
+
+Usage:
+    python -m benchmarks.record --output benchmarks/fixtures
+
+Fetches the same pages the app would for one title, following search results
+to title pages with the app's own extractors, and saves each as
+<source>.html for benchmarks/extractors.py --fixtures.
+"""
+import argparse
+import asyncio
+import logging
+import os
+
+from app.client import close_client
+from app.parsing import extract
+from app.scraper import (
+    BASE_URLS,
+    HEADERS,
+    STRAINERS,
+    extract_letterboxd_url,
+    extract_rottentomatoes_url,
+    make_request,
+)
+
+
+async def record(source, url, output):
+    """Fetch a page and save it as the source's fixture"""
+    content = await make_request(url, HEADERS)
+
+    with open(os.path.join(output, f"{source}.html"), "wb") as file:
+        file.write(content)
+
+    logging.info(f"Recorded {source} ({len(content)} bytes) from {url}")
+
+    return content
+
+
+async def main(args):
+    os.makedirs(args.output, exist_ok=True)
+    title, year = args.title, args.year
+
+    try:
+        rt_search = await record(
+            "rottentomatoes_url",
+            f"{BASE_URLS['rottentomatoes']}{title.replace(' ', '%20')}",
+            args.output,
+        )
+        letterboxd_search = await record(
+            "letterboxd_url",
+            f"{BASE_URLS['letterboxd']}{title.replace(' ', '+')}/",
+            args.output,
+        )
+        await record(
+            "commonsense_info",
+            f"{BASE_URLS['commonsensemedia']}{title.replace(' ', '%20')}",
+            args.output,
+        )
+        await record("imdb_rating", f"{BASE_URLS['imdb']}{args.imdb_id}", args.output)
+        await record(
+            "box_office_amounts",
+            f"{BASE_URLS['boxofficemojo']}{args.imdb_id}/",
+            args.output,
+        )
+        await record(
+            "justwatch_page",
+            f"https://www.themoviedb.org/movie/{args.tmdb_id}/watch?locale=US",
+            args.output,
+        )
+
+        # Title pages are found through the search pages, as the app finds them
+        rt_url = extract(
+            rt_search,
+            STRAINERS["rottentomatoes_url"],
+            extract_rottentomatoes_url,
+            year,
+            "Movie",
+        )
+        letterboxd_url = extract(
+            letterboxd_search,
+            STRAINERS["letterboxd_url"],
+            extract_letterboxd_url,
+            year,
+        )
+
+        if rt_url:
+            await record("rottentomatoes_scores", rt_url, args.output)
+        else:
+            logging.error("No RottenTomatoes result, scorecard page not recorded")
+
+        if letterboxd_url:
+            await record("letterboxd_rating", letterboxd_url, args.output)
+        else:
+            logging.error("No Letterboxd result, film page not recorded")
+
+    finally:
+        await close_client()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--output", "-o", default="benchmarks/fixtures")
+    parser.add_argument("--title", default="Heat", help="A movie title")
+    parser.add_argument("--year", default="1995")
+    parser.add_argument("--imdb-id", default="tt0113277")
+    parser.add_argument("--tmdb-id", default="949")
+
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,225 @@
+# upstreams.py
+"""
+Local stand-ins for TMDB and every scraped site, for load testing.
+
+Usage:
+    python -m benchmarks.upstreams --latency 80 --error-rate 0.01
+
+Each site is served on its own loopback address (127.0.0.2, 127.0.0.3, ...)
+so the app keeps a separate rate limiter and circuit breaker per site, as it
+does for the real hosts. Pages are the benchmark fixtures, with links
+rewritten to point back at the stand-ins. The environment variables that
+point the app at them are printed on startup.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+
+import uvicorn
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from .extractors import load_pages
+
+# Each stand-in's site name, its real origin, and its app base URL setting
+SITES = {
+    "tmdb_api": ("https://api.themoviedb.org", "TMDB_API_URL"),
+    "themoviedb": ("https://www.themoviedb.org", None),
+    "rottentomatoes": ("https://www.rottentomatoes.com", "BASE_URL_ROTTENTOMATOES"),
+    "letterboxd": ("https://letterboxd.com", "BASE_URL_LETTERBOXD"),
+    "commonsensemedia": (
+        "https://www.commonsensemedia.org",
+        "BASE_URL_COMMONSENSEMEDIA",
+    ),
+    "imdb": ("https://www.imdb.com", "BASE_URL_IMDB"),
+    "boxofficemojo": ("https://www.boxofficemojo.com", "BASE_URL_BOXOFFICEMOJO"),
+}
+
+# The app's base URL path for each scraped site
+BASE_PATHS = {
+    "TMDB_API_URL": "/3",
+    "BASE_URL_ROTTENTOMATOES": "/search?search=",
+    "BASE_URL_LETTERBOXD": "/search/",
+    "BASE_URL_COMMONSENSEMEDIA": "/search/",
+    "BASE_URL_IMDB": "/title/",
+    "BASE_URL_BOXOFFICEMOJO": "/title/",
+}
+
+
+def get_origins(port):
+    """Get the local origin of each stand-in"""
+    return {
+        site: f"http://127.0.0.{index}:{port}"
+        for index, site in enumerate(SITES, start=2)
+    }
+
+
+def get_app_env(port):
+    """Get the environment variables that point the app at the stand-ins"""
+    origins = get_origins(port)
+
+    return {
+        setting: origins[site] + BASE_PATHS[setting]
+        for site, (_, setting) in SITES.items()
+        if setting
+    }
+
+
+def rewrite(content, origins):
+    """Point links at the real sites back at their stand-ins"""
+    for site, (origin, _) in SITES.items():
+        content = content.replace(origin.encode(), origins[site].encode())
+
+    return content
+
+
+def get_page_name(site, path):
+    """Pick the fixture page a scraped site serves for a path"""
+    searching = path.startswith("/search")
+
+    if site == "rottentomatoes":
+        return "rottentomatoes_url" if searching else "rottentomatoes_scores"
+
+    if site == "letterboxd":
+        return "letterboxd_url" if searching else "letterboxd_rating"
+
+    return {
+        "commonsensemedia": "commonsense_info",
+        "imdb": "imdb_rating",
+        "boxofficemojo": "box_office_amounts",
+        "themoviedb": "justwatch_page",
+    }[site]
+
+
+def get_tmdb_json(path, origins):
+    """Answer a TMDB API path with enough data for the app"""
+    parts = path.strip("/").split("/")
+    result = {
+        "id": 949,
+        "media_type": "movie",
+        "title": "Heat",
+        "release_date": "1995-12-15",
+        "poster_path": "/heat.jpg",
+    }
+
+    if parts[1] in ("search", "trending") or parts[-1] == "popular":
+        return {
+            "results": [
+                {**result, "id": tmdb_id, "title": f"Heat {tmdb_id}"}
+                for tmdb_id in range(949, 969)
+            ]
+        }
+
+    tmdb_id = int(parts[2])
+
+    return {
+        **result,
+        "id": tmdb_id,
+        "imdb_id": f"tt{tmdb_id:07d}",
+        "runtime": 170,
+        "overview": "A group of high-end professional thieves start to feel the heat.",
+        "genres": [{"id": 80, "name": "Crime"}],
+        "release_dates": {
+            "results": [{"iso_3166_1": "US", "release_dates": [{"certification": "R"}]}]
+        },
+        "watch/providers": {
+            "results": {
+                "US": {"link": f"{origins['themoviedb']}/movie/{tmdb_id}/watch"}
+            }
+        },
+        "external_ids": {"imdb_id": f"tt{tmdb_id:07d}"},
+        "credits": {
+            "cast": [{"name": "Al Pacino"}, {"name": "Robert De Niro"}],
+            "crew": [{"name": "Michael Mann", "job": "Director"}],
+        },
+    }
+
+
+def make_site(site, pages, origins, args):
+    """Build the stand-in app for one site"""
+    rng = random.Random(site)
+
+    async def serve(request):
+        delay = rng.gauss(args.latency, args.latency * args.jitter) / 1000
+
+        # A slow tail: a few requests take far longer than the rest
+        if rng.random() < args.tail_rate:
+            delay += args.tail_latency / 1000
+
+        await asyncio.sleep(max(delay, 0))
+
+        if rng.random() < args.error_rate:
+            return Response(status_code=503)
+
+        if site == "tmdb_api":
+            return JSONResponse(get_tmdb_json(request.url.path, origins))
+
+        page = pages[get_page_name(site, request.url.path)]
+
+        return Response(page, media_type="text/html")
+
+    return Starlette(routes=[Route("/{path:path}", serve)])
+
+
+async def serve_upstreams(args):
+    """Run every stand-in until cancelled"""
+    origins = get_origins(args.port)
+    pages, recorded = load_pages(args.fixtures)
+    pages = {name: rewrite(page, origins) for name, page in pages.items()}
+    servers = []
+
+    for site, origin in origins.items():
+        host = origin.split("//")[1].split(":")[0]
+        config = uvicorn.Config(
+            make_site(site, pages, origins, args),
+            host=host,
+            port=args.port,
+            log_level="warning",
+            access_log=False,
+        )
+        server = uvicorn.Server(config)
+
+        # Several servers share the process, so leave signals at their defaults
+        server.install_signal_handlers = lambda: None
+        servers.append(server)
+
+    logging.info(f"Serving {len(servers)} stand-ins, recorded pages: {recorded}")
+    print(json.dumps(get_app_env(args.port)), flush=True)
+
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def add_arguments(parser):
+    """Add the stand-in behaviour options to a parser"""
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--fixtures", help="Directory of recorded <source>.html")
+    parser.add_argument(
+        "--latency", type=float, default=50.0, help="Mean latency in ms"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.3, help="Latency std dev, as a fraction"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Fraction answered with 503"
+    )
+    parser.add_argument(
+        "--tail-rate", type=float, default=0.01, help="Fraction that are slow"
+    )
+    parser.add_argument(
+        "--tail-latency", type=float, default=2000.0, help="Extra ms when slow"
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_arguments(parser)
+
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(serve_upstreams(parse_args()))
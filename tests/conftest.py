@@ -0,0 +1,52 @@
+# conftest.py
+import os
+import tempfile
+import time
+
+import pytest
+
+# Settings the app reads at import time, kept away from the real cache file
+os.environ.setdefault("TMDB_API_KEY", "test")
+os.environ.setdefault("SESSION_SECRET_KEY", "test")
+os.environ.setdefault("CACHE_PATH", os.path.join(tempfile.mkdtemp(), "cache.sqlite3"))
+
+from app import cache, id_index  # noqa: E402
+
+
+class Clock:
+    """Wall clock the tests move forward by hand"""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock.time)
+
+    return clock
+
+
+@pytest.fixture
+def caches(monkeypatch, tmp_path):
+    """Give each test empty cache and ID index tiers"""
+    path = str(tmp_path / "cache.sqlite3")
+    disk_cache = cache.DiskCache(path)
+    index = id_index.IdIndex(path)
+    monkeypatch.setattr(cache, "disk_cache", disk_cache)
+    monkeypatch.setattr(cache, "memory_cache", cache.MemoryCache(64))
+    monkeypatch.setattr(cache, "pruned_at", {})
+    monkeypatch.setattr(id_index, "id_index", index)
+    monkeypatch.setattr(id_index, "memory_index", cache.MemoryCache(64))
+
+    yield
+
+    disk_cache.close()
+    index.close()
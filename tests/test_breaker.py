@@ -0,0 +1,90 @@
+# test_breaker.py
+import time
+
+import pytest
+
+from app import breaker
+from app.breaker import (
+    BREAKER_FAILURES,
+    BREAKER_RESET,
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    SourceUnavailable,
+    check,
+    record_failure,
+    record_success,
+)
+
+
+class Monotonic:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def monotonic(monkeypatch):
+    monotonic = Monotonic()
+    monkeypatch.setattr(time, "monotonic", monotonic)
+    monkeypatch.setattr(breaker, "breakers", {})
+    monkeypatch.setattr(breaker, "failed_urls", breaker.MemoryCache(64))
+
+    return monotonic
+
+
+def open_circuit(host):
+    for number in range(BREAKER_FAILURES):
+        record_failure(f"https://{host}/failing/{number}")
+
+    return breaker.get_breaker(host)
+
+
+def test_failures_open_the_circuit(monotonic):
+    circuit = open_circuit("example.com")
+
+    assert circuit.state == OPEN
+    with pytest.raises(SourceUnavailable):
+        check("https://example.com/other")
+
+
+def test_successful_probe_closes_the_circuit(monotonic):
+    circuit = open_circuit("example.com")
+    monotonic.now += BREAKER_RESET
+
+    check("https://example.com/probe")
+    assert circuit.state == HALF_OPEN
+
+    record_success("https://example.com/probe")
+    assert circuit.state == CLOSED
+    check("https://example.com/other")
+
+
+def test_failed_probe_opens_the_circuit_again(monotonic):
+    circuit = open_circuit("example.com")
+    monotonic.now += BREAKER_RESET
+
+    check("https://example.com/probe")
+    record_failure("https://example.com/probe")
+
+    assert circuit.state == OPEN
+    with pytest.raises(SourceUnavailable):
+        check("https://example.com/other")
+
+
+def test_probe_answered_with_not_found_closes_the_circuit(monotonic):
+    circuit = open_circuit("example.com")
+    monotonic.now += BREAKER_RESET
+
+    check("https://example.com/missing")
+    record_failure("https://example.com/missing", host_error=False)
+
+    assert circuit.state == CLOSED
+    assert not circuit.probing
+    check("https://example.com/other")
+
+    # The missing URL itself is still answered from the negative cache
+    with pytest.raises(SourceUnavailable):
+        check("https://example.com/missing")
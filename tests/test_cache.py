@@ -0,0 +1,28 @@
+# test_cache.py
+import asyncio
+
+from app import cache
+from app.cache import CACHE_GRACE, CACHE_TTLS, cached, make_key
+
+
+def test_entries_past_grace_are_pruned(clock, caches):
+    @cached("imdb_rating")
+    async def rating(url):
+        return "8.3"
+
+    async def run():
+        await rating("https://www.imdb.com/title/tt1")
+        clock.advance(CACHE_TTLS["imdb_rating"] + CACHE_GRACE + 1)
+        await rating("https://www.imdb.com/title/tt2")
+
+    asyncio.run(run())
+
+    # Storing tt2 swept tt1, which could no longer be served
+    assert (
+        cache.disk_cache.get(make_key("imdb_rating", "https://www.imdb.com/title/tt1"))
+        is None
+    )
+    assert (
+        cache.disk_cache.get(make_key("imdb_rating", "https://www.imdb.com/title/tt2"))
+        is not None
+    )
@@ -0,0 +1,42 @@
+# test_export.py
+import asyncio
+
+from app import export
+
+
+def test_only_complete_titles_are_checkpointed(monkeypatch, tmp_path):
+    titles = tmp_path / "titles.csv"
+    titles.write_text("tmdb_id,media_type\n1,movie\n2,movie\n3,tv\n4,movie\n")
+    output = str(tmp_path / "ratings.jsonl")
+    statuses = {"1": "ok", "2": "miss", "3": "error", "4": "ok"}
+    unavailable = {"4": ["letterboxd_rating"]}
+    rated = []
+
+    async def rate_titles(titles, concurrency, only_cached=False):
+        for tmdb_id, media_type in titles:
+            rated.append(tmdb_id)
+            yield {
+                "tmdb_id": tmdb_id,
+                "media_type": media_type,
+                "status": statuses[tmdb_id],
+                "unavailable": unavailable.get(tmdb_id, []),
+            }
+
+    monkeypatch.setattr(export, "rate_titles", rate_titles)
+
+    asyncio.run(export.export(export.parse_args([str(titles), "-o", output])))
+    assert export.read_checkpoint(f"{output}.checkpoint") == {"Movie/1"}
+
+    # A full run after a cache-only one fills in the missed and failed titles,
+    # and those with a source unavailable
+    rated.clear()
+    statuses.update({"2": "ok", "3": "ok"})
+    unavailable.clear()
+    asyncio.run(export.export(export.parse_args([str(titles), "-o", output])))
+    assert rated == ["2", "3", "4"]
+    assert export.read_checkpoint(f"{output}.checkpoint") == {
+        "Movie/1",
+        "Movie/2",
+        "TV/3",
+        "Movie/4",
+    }
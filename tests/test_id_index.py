@@ -0,0 +1,72 @@
+# test_id_index.py
+import asyncio
+
+from app.cache import CACHE_TTLS, cache_only, cached
+from app.id_index import INDEX_NEGATIVE_TTL, indexed
+
+
+def make_lookup(results):
+    """Build an indexed, cached search that records each time it runs"""
+    searches = []
+
+    @cached("rottentomatoes_url")
+    async def search(title, year):
+        searches.append((title, year))
+        return results[len(searches) - 1]
+
+    return indexed("rottentomatoes_url", search), searches
+
+
+def test_not_found_is_searched_again_after_negative_ttl(clock, caches):
+    lookup, searches = make_lookup([None, "https://example.com/m/heat"])
+
+    async def run():
+        assert await lookup("tt0113277", "Heat", "1995") is None
+        assert await lookup("tt0113277", "Heat", "1995") is None
+        assert len(searches) == 1
+
+        # Still inside the source's cache TTL, but past the index's
+        clock.advance(INDEX_NEGATIVE_TTL + 1)
+        assert INDEX_NEGATIVE_TTL + 1 < CACHE_TTLS["rottentomatoes_url"]
+
+        assert await lookup("tt0113277", "Heat", "1995") == (
+            "https://example.com/m/heat"
+        )
+        assert len(searches) == 2
+
+    asyncio.run(run())
+
+
+def test_resolved_url_is_not_searched_again(clock, caches):
+    lookup, searches = make_lookup(["https://example.com/m/heat"])
+
+    async def run():
+        await lookup("tt0113277", "Heat", "1995")
+        clock.advance(INDEX_NEGATIVE_TTL + 1)
+
+        assert await lookup("tt0113277", "Heat", "1995") == (
+            "https://example.com/m/heat"
+        )
+        assert len(searches) == 1
+
+    asyncio.run(run())
+
+
+def test_cache_only_read_does_not_renew_expired_entry(clock, caches):
+    lookup, searches = make_lookup([None, "https://example.com/m/heat"])
+
+    async def run():
+        await lookup("tt0113277", "Heat", "1995")
+        clock.advance(INDEX_NEGATIVE_TTL + 1)
+
+        # The warmer checks titles from the cache alone
+        cache_only.set(True)
+        assert await lookup("tt0113277", "Heat", "1995") is None
+        cache_only.set(False)
+
+        assert await lookup("tt0113277", "Heat", "1995") == (
+            "https://example.com/m/heat"
+        )
+        assert len(searches) == 2
+
+    asyncio.run(run())
@@ -0,0 +1,66 @@
+# test_pagecache.py
+from fastapi.testclient import TestClient
+
+from app import main, pagecache
+from app.cache import MemoryCache
+
+
+class FakeExecution:
+    """Execution whose sources resolve at once, some of them unavailable"""
+
+    unavailable = set()
+
+    def __init__(self, media_type, details):
+        self.sources = []
+
+    async def run(self):
+        return {}
+
+    def critical_path(self):
+        return []
+
+
+def request_details(monkeypatch, unavailable):
+    async def get_title_details(tmdb_id, media_type, api_key):
+        return {
+            "tmdb_id": tmdb_id,
+            "imdb_id": "tt0113277",
+            "title": "Heat",
+            "year": "1995",
+            "certification": "R",
+            "runtime": "2h 50m",
+            "director": "Michael Mann",
+            "creator": None,
+            "poster_img": None,
+            "justwatch_url": None,
+        }
+
+    async def record_titles(titles):
+        pass
+
+    monkeypatch.setattr(FakeExecution, "unavailable", unavailable)
+    monkeypatch.setattr(main, "Execution", FakeExecution)
+    monkeypatch.setattr(main, "get_title_details", get_title_details)
+    monkeypatch.setattr(main, "record_titles", record_titles)
+    monkeypatch.setattr(main, "STREAM_DETAILS", False)
+
+    return TestClient(main.app).get("/details/949/Movie/")
+
+
+def test_complete_details_page_is_cached(monkeypatch):
+    monkeypatch.setattr(pagecache, "rendered_pages", MemoryCache(8))
+    response = request_details(monkeypatch, set())
+
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == pagecache.PAGE_CACHE_CONTROL
+    assert len(pagecache.rendered_pages.entries) == 1
+
+
+def test_degraded_details_page_is_not_cached(monkeypatch):
+    monkeypatch.setattr(pagecache, "rendered_pages", MemoryCache(8))
+    response = request_details(monkeypatch, {"imdb_rating"})
+
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-store"
+    assert "IMDb" in response.text
+    assert len(pagecache.rendered_pages.entries) == 0
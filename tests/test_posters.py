@@ -0,0 +1,43 @@
+# test_posters.py
+import asyncio
+
+import httpx
+
+from app import posters
+
+
+def test_variants_are_resized_from_the_original(monkeypatch, tmp_path):
+    cache = posters.PosterCache(str(tmp_path), 10 * 1024 * 1024)
+    downloads = []
+    resized = []
+
+    def respond(request):
+        downloads.append(request.url.path)
+        return httpx.Response(200, content=b"original")
+
+    def resize(content, width, image_format):
+        resized.append((content, width))
+        return f"{width}:{content.decode()}".encode()
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+    monkeypatch.setattr(posters, "poster_cache", cache)
+    monkeypatch.setattr(posters, "get_client", lambda: client)
+    monkeypatch.setattr(posters, "resize", resize)
+
+    async def run():
+        # The w500 JPEG variant has the same name as the w500 original
+        assert await posters.render_variant("w500", "heat.jpg", False) == (
+            b"500:original"
+        )
+        assert await posters.render_variant("w185", "heat.jpg", False) == (
+            b"185:original"
+        )
+        assert await posters.render_variant("w500", "heat.jpg", False) == (
+            b"500:original"
+        )
+
+    asyncio.run(run())
+
+    assert downloads == ["/t/p/w500/heat.jpg"]
+    assert resized == [(b"original", 500), (b"original", 185)]
+    assert cache.get(posters.SOURCE_FOLDER, "heat.jpg") == b"original"
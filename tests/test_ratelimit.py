@@ -0,0 +1,67 @@
+# test_ratelimit.py
+import asyncio
+
+from app.ratelimit import BACKGROUND, INTERACTIVE, HostLimiter
+
+
+def test_queued_callers_share_one_wakeup_timer():
+    async def run():
+        limiter = HostLimiter(rate=100, burst=1, concurrency=10)
+        loop = asyncio.get_running_loop()
+        scheduled = []
+        call_later = loop.call_later
+
+        def counting_call_later(delay, callback, *args):
+            scheduled.append(delay)
+            return call_later(delay, callback, *args)
+
+        loop.call_later = counting_call_later
+
+        # The first caller takes the only token, the rest queue for more
+        await limiter.acquire(INTERACTIVE)
+        tasks = [asyncio.create_task(limiter.acquire(INTERACTIVE)) for _ in range(5)]
+        await asyncio.sleep(0)
+
+        assert len(scheduled) == 1
+
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=1)
+        assert limiter.active == 6
+        assert limiter.timer is None
+
+    asyncio.run(run())
+
+
+def test_interactive_callers_go_before_background_ones():
+    async def run():
+        limiter = HostLimiter(rate=100, burst=1, concurrency=10)
+        order = []
+
+        async def request(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+
+        await limiter.acquire(INTERACTIVE)
+        background = asyncio.create_task(request("background", BACKGROUND))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(request("interactive", INTERACTIVE))
+
+        await asyncio.wait_for(asyncio.gather(background, interactive), timeout=1)
+        assert order == ["interactive", "background"]
+
+    asyncio.run(run())
+
+
+def test_cancelled_caller_gives_up_its_place():
+    async def run():
+        limiter = HostLimiter(rate=100, burst=1, concurrency=1)
+        await limiter.acquire(INTERACTIVE)
+
+        waiting = asyncio.create_task(limiter.acquire(INTERACTIVE))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        limiter.release()
+
+        await asyncio.wait_for(limiter.acquire(INTERACTIVE), timeout=1)
+        assert limiter.active == 1
+
+    asyncio.run(run())
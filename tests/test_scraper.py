@@ -0,0 +1,115 @@
+# test_scraper.py
+import asyncio
+
+import httpx
+import pytest
+
+from app import cache, scraper
+from app.cache import CACHE_GRACE, CACHE_TTLS
+
+
+@pytest.fixture
+def upstream(monkeypatch, caches):
+    """Serve one page with an ETag, answering revalidations with 304"""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"etag": '"v1"'})
+
+        return httpx.Response(
+            200,
+            headers={"etag": '"v1"'},
+            html='<div data-testid="hero-rating-bar__aggregate-rating__score">'
+            "<span>8.3</span><span>/10</span></div>",
+        )
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(scraper, "get_client", lambda: client)
+    monkeypatch.setattr(scraper, "disk_cache", cache.disk_cache)
+
+    return requests
+
+
+def rate(url):
+    return asyncio.run(scraper.scrape("imdb_rating", url, scraper.extract_imdb_rating))
+
+
+def test_unchanged_page_is_revalidated(clock, upstream):
+    assert rate("https://www.imdb.com/title/tt1") == "8.3"
+    assert rate("https://www.imdb.com/title/tt1") == "8.3"
+
+    assert upstream[1].headers["if-none-match"] == '"v1"'
+
+
+def test_expired_validators_are_ignored_and_pruned(clock, upstream):
+    rate("https://www.imdb.com/title/tt1")
+    clock.advance(CACHE_TTLS["imdb_rating"] + CACHE_GRACE + 1)
+
+    rate("https://www.imdb.com/title/tt2")
+    assert "if-none-match" not in upstream[1].headers
+
+    # The sweep after storing tt2's validators deleted tt1's
+    key = cache.make_key("imdb_rating_validators", "https://www.imdb.com/title/tt1")
+    assert cache.disk_cache.get(key) is None
+
+
+class Chunks(httpx.AsyncByteStream):
+    """Stream a body in small chunks, counting how many were read"""
+
+    def __init__(self, body):
+        self.body = body
+        self.read = 0
+
+    async def __aiter__(self):
+        for offset in range(0, len(self.body), 4096):
+            self.read += 1
+            yield self.body[offset : offset + 4096]
+
+
+def read_page(padding, headers=None):
+    """Read a page with a rating near the top and padding after it"""
+    page = (
+        b'<div data-testid="hero-rating-bar__aggregate-rating__score">'
+        b"<span>8.3</span><span>/10</span></div>" + b"x" * padding
+    )
+    stream = Chunks(page)
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, headers=headers, stream=stream)
+        )
+    )
+
+    async def run():
+        async with client.stream("GET", "https://www.imdb.com/title/tt1") as response:
+            return await scraper.read_body(response, scraper.END_MARKERS["imdb_rating"])
+
+    content, outcome = asyncio.run(run())
+
+    return content, outcome, stream.read, -(-len(page) // 4096)
+
+
+def test_small_remainder_is_drained_to_keep_the_connection():
+    content, outcome, read, chunks = read_page(16 * 1024)
+
+    assert content.endswith(b"</div>")
+    assert outcome == "drained"
+    assert read == chunks
+
+
+def test_large_remainder_is_cut_short():
+    content, outcome, read, chunks = read_page(1024 * 1024)
+
+    assert content.endswith(b"</div>")
+    assert outcome == "cut_short"
+    assert read < chunks / 10
+
+
+def test_large_declared_length_is_cut_short_without_draining():
+    headers = {"content-length": str(1024 * 1024 + 99)}
+    _, outcome, read, _ = read_page(1024 * 1024, headers)
+
+    assert outcome == "cut_short"
+    assert read == 1
@@ -0,0 +1,68 @@
+# test_singleflight.py
+import asyncio
+
+import pytest
+
+from app import singleflight
+from app.singleflight import single_flight
+
+
+def test_concurrent_callers_share_one_lookup():
+    calls = []
+
+    async def lookup(url):
+        calls.append(url)
+        await asyncio.sleep(0.01)
+        return f"page for {url}"
+
+    async def run():
+        return await asyncio.gather(
+            *(single_flight("key", lookup, "https://example.com") for _ in range(5))
+        )
+
+    assert asyncio.run(run()) == ["page for https://example.com"] * 5
+    assert calls == ["https://example.com"]
+    assert singleflight.inflight == {}
+
+
+def test_failure_reaches_every_caller_and_is_not_kept():
+    calls = []
+
+    async def lookup():
+        calls.append(None)
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def run():
+        results = await asyncio.gather(
+            single_flight("key", lookup),
+            single_flight("key", lookup),
+            return_exceptions=True,
+        )
+
+        # The failed lookup is forgotten, so the next caller starts afresh
+        with pytest.raises(ValueError):
+            await single_flight("key", lookup)
+
+        return results
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len(calls) == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def lookup():
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        first = asyncio.create_task(single_flight("key", lookup))
+        second = asyncio.create_task(single_flight("key", lookup))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        return await second
+
+    assert asyncio.run(run()) == "value"
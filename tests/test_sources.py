@@ -0,0 +1,79 @@
+# test_sources.py
+import asyncio
+
+from app import metrics, sources
+from app.sources import MOVIE, Execution, Source
+
+
+async def fast():
+    return "fast"
+
+
+async def slow():
+    await asyncio.sleep(1)
+    return "slow"
+
+
+async def broken():
+    raise RuntimeError("upstream changed its markup")
+
+
+async def dependent(value):
+    return f"after {value}"
+
+
+async def stuck():
+    await asyncio.sleep(10)
+
+
+def use_sources(monkeypatch, graph, deadlines):
+    graph = [Source(name, func, inputs, {MOVIE}) for name, func, inputs in graph]
+    monkeypatch.setattr(sources, "SOURCES", graph)
+    monkeypatch.setattr(sources, "SOURCES_BY_NAME", {s.name: s for s in graph})
+    monkeypatch.setattr(sources, "SOURCE_DEADLINES", deadlines)
+
+
+def test_failed_late_and_cancelled_sources_are_unavailable(monkeypatch):
+    use_sources(
+        monkeypatch,
+        [
+            ("fast", fast, []),
+            ("slow", slow, []),
+            ("broken", broken, []),
+            ("dependent", dependent, ["broken"]),
+            ("stuck", stuck, []),
+        ],
+        {"fast": 1, "slow": 0.05, "broken": 1, "dependent": 1, "stuck": 10},
+    )
+    timeouts = metrics.SOURCE_TIMEOUTS.values[(("source", "slow"),)]
+    execution = Execution(MOVIE, {"imdb_id": "tt0000001"}, budget=0.3)
+
+    results = asyncio.run(execution.run())
+
+    assert results == {
+        "fast": "fast",
+        "slow": None,
+        "broken": None,
+        "dependent": None,
+        "stuck": None,
+    }
+    assert execution.unavailable == {"slow", "broken", "dependent", "stuck"}
+    assert metrics.SOURCE_TIMEOUTS.values[(("source", "slow"),)] == timeouts + 1
+
+
+def test_stream_yields_every_source(monkeypatch):
+    use_sources(
+        monkeypatch,
+        [("fast", fast, []), ("slow", slow, []), ("stuck", stuck, [])],
+        {"fast": 1, "slow": 0.05, "stuck": 10},
+    )
+    execution = Execution(MOVIE, {"imdb_id": "tt0000001"}, budget=0.3)
+
+    async def collect():
+        return [item async for item in execution.stream()]
+
+    assert asyncio.run(collect()) == [
+        ("fast", "fast"),
+        ("slow", None),
+        ("stuck", None),
+    ]
@@ -0,0 +1,37 @@
+# test_suggest.py
+from app import suggest
+from app.suggest import SuggestIndex
+
+
+def title(tmdb_id, name):
+    return {"tmdb_id": tmdb_id, "title": name, "year": "", "media_type": "movie"}
+
+
+def test_prefix_matches_rank_titles_starting_with_the_query_first(tmp_path):
+    index = SuggestIndex(str(tmp_path / "cache.sqlite3"))
+
+    for tmdb_id, name in enumerate(["The Heat", "Heat", "Amélie", "Heatwave"]):
+        index.add(title(tmdb_id, name))
+
+    assert [match["title"] for match in index.search("hea")] == [
+        "Heat",
+        "Heatwave",
+        "The Heat",
+    ]
+    assert [match["title"] for match in index.search("AMELIE!")] == ["Amélie"]
+
+
+def test_full_index_evicts_the_least_recently_used_title(monkeypatch, tmp_path):
+    monkeypatch.setattr(suggest, "SUGGEST_MAX_TITLES", 2)
+    index = SuggestIndex(str(tmp_path / "cache.sqlite3"))
+    index.add(title(1, "Heat"))
+    index.add(title(2, "Alien"))
+
+    # Suggesting Heat makes Alien the least recently used title
+    index.search("heat")
+    assert index.add(title(3, "Ronin"))
+
+    assert index.search("alien") == []
+    assert [match["title"] for match in index.search("ronin")] == ["Ronin"]
+    assert index.evicted == ["movie/2"]
+    assert "alie" not in index.prefixes
@@ -0,0 +1,51 @@
+# test_tmdb.py
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app import tmdb
+
+
+def serve(monkeypatch, responses):
+    """Answer TMDB requests with the given responses, in order"""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return responses[len(requests) - 1]
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(tmdb, "get_client", lambda: client)
+
+    return requests
+
+
+def test_short_retry_after_is_honoured(monkeypatch):
+    monkeypatch.setattr(tmdb, "TMDB_MAX_RETRY_AFTER", 0.5)
+    requests = serve(
+        monkeypatch,
+        [
+            httpx.Response(429, headers={"Retry-After": "0"}),
+            httpx.Response(200, json={"id": 949}),
+        ],
+    )
+
+    result = asyncio.run(tmdb.fetch_json(f"{tmdb.TMDB_API_URL}/movie/949"))
+
+    assert result == {"id": 949}
+    assert len(requests) == 2
+
+
+def test_long_retry_after_fails_fast(monkeypatch):
+    requests = serve(
+        monkeypatch, [httpx.Response(429, headers={"Retry-After": "3600"})]
+    )
+    started = time.monotonic()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(tmdb.fetch_json(f"{tmdb.TMDB_API_URL}/movie/949"))
+
+    assert len(requests) == 1
+    assert time.monotonic() - started < 1
@@ -0,0 +1,48 @@
+# test_warmer.py
+import asyncio
+import fcntl
+
+import pytest
+
+from app import cache, warmer
+
+
+@pytest.fixture
+def ratings(monkeypatch, caches):
+    """Answer collect_ratings with a title whose Letterboxd rating is missing"""
+    monkeypatch.setattr(warmer, "disk_cache", cache.disk_cache)
+
+    async def collect_ratings(tmdb_id, media_type):
+        return {"details": {}, "ratings": {}, "unavailable": ["letterboxd_rating"]}
+
+    monkeypatch.setattr(warmer, "collect_ratings", collect_ratings)
+
+
+def test_unavailable_title_is_warm_once_attempted(clock, ratings):
+    async def run():
+        assert not await warmer.is_warm("949", "Movie")
+
+        await warmer.record_attempt("949", "Movie", "ok")
+        assert await warmer.is_warm("949", "Movie")
+
+        clock.advance(warmer.WARMER_RETRY_AFTER)
+        assert not await warmer.is_warm("949", "Movie")
+
+    asyncio.run(run())
+
+
+def test_only_one_process_holds_the_warmer_lock(monkeypatch, tmp_path):
+    path = str(tmp_path / "warmer.lock")
+    monkeypatch.setattr(warmer, "WARMER_LOCK_PATH", path)
+
+    assert warmer.acquire_lock()
+
+    try:
+        with open(path, "a") as other, pytest.raises(OSError):
+            fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    finally:
+        warmer.release_lock()
+
+    with open(path, "a") as other:
+        fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)